@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+"""
+Microbenchmark for parsing Claude's structured output
+
+Times the old three-tier fallback (json.loads, greedy {...} search, per-field
+regexes) against structured_output.parse_json_output on synthetic responses of
+growing size, both well-formed and in the broken shapes Claude actually sends.
+
+    python bench_structured_output.py [--sizes 10,100,1000] [--repeat 5]
+"""
+
+import argparse
+import json
+import re
+import time
+
+from structured_output import parse_json_output, parse_labeled_fields, split_sections
+
+def legacy_parse(claude_response):
+    """The json.loads / greedy search / per-field regex chain the generators used to run"""
+    try:
+        return json.loads(claude_response)
+    except json.JSONDecodeError:
+        pass
+    try:
+        json_match = re.search(r'({[\s\S]*})', claude_response)
+        if json_match:
+            return json.loads(json_match.group(1))
+    except Exception:
+        pass
+
+    title_match = re.search(r'"title":\s*"([^"]+)"', claude_response)
+    focus_match = re.search(r'"focus_keyphrase":\s*"([^"]+)"', claude_response)
+    meta_match = re.search(r'"meta_description":\s*"([^"]+)"', claude_response)
+    content_match = re.search(r'"content":\s*"([\s\S]+?)"(?=,\s*"tags"|$)', claude_response)
+    tags_match = re.search(r'"tags":\s*\[(.*?)\]', claude_response)
+    if title_match and focus_match and meta_match and content_match:
+        return {
+            "title": title_match.group(1),
+            "focus_keyphrase": focus_match.group(1),
+            "meta_description": meta_match.group(1),
+            "content": content_match.group(1).replace('\\n', '\n').replace('\\"', '"'),
+            "tags": re.findall(r'"([^"]+)"', tags_match.group(1)) if tags_match else []
+        }
+    return None
+
+def legacy_sections(content):
+    """The three DOTALL searches the REST script used for ---TITLE--- style output"""
+    title_match = re.search(r'---TITLE---\s*(.*?)(?=---CONTENT---)', content, re.DOTALL)
+    content_match = re.search(r'---CONTENT---\s*(.*?)(?=---META---)', content, re.DOTALL)
+    meta_match = re.search(r'---META---\s*(.*)', content, re.DOTALL)
+    if not title_match or not content_match or not meta_match:
+        return None
+    meta_text = meta_match.group(1).strip()
+    return {
+        'title': title_match.group(1).strip(),
+        'content': content_match.group(1).strip(),
+        'tags': re.search(r'Tags:\s*(.*?)(?=\n|$)', meta_text)
+    }
+
+def new_sections(content):
+    """split_sections plus parse_labeled_fields, as the REST script does now"""
+    sections = split_sections(content, ['---TITLE---', '---CONTENT---', '---META---'])
+    if len(sections) < 3:
+        return None
+    fields = parse_labeled_fields(sections['---META---'], ['Meta description', 'Tags', 'Excerpt'])
+    return {'title': sections['---TITLE---'], 'content': sections['---CONTENT---'], 'tags': fields['Tags']}
+
+def make_body(size_kb):
+    """HTML-ish body text of roughly size_kb kilobytes"""
+    paragraph = '<p>Kubernetes is "easy", they said. See <a href="https://example.com/k8s">the docs</a> and {{IMAGE: a cluster}}.</p>\n'
+    return paragraph * max(1, size_kb * 1024 // len(paragraph))
+
+def make_samples(size_kb):
+    """Return the body and the (name, text, kind) samples built around it for one size"""
+    body = make_body(size_kb)
+    post = {
+        "title": "Taming the Cluster",
+        "focus_keyphrase": "kubernetes tips",
+        "meta_description": "A witty guide.",
+        "content": body,
+        "tags": ["kubernetes", "devops"]
+    }
+    clean = json.dumps(post)
+    fenced = "Here's your post!\n```json\n" + json.dumps(post, indent=2) + "\n```\nEnjoy."
+
+    # Raw newlines and unescaped quotes in the content, plus a trailing comma
+    broken = (
+        '{\n  "title": "Taming the Cluster",\n  "focus_keyphrase": "kubernetes tips",\n'
+        '  "meta_description": "A witty guide.",\n  "content": "' + body + '",\n'
+        '  "tags": ["kubernetes", "devops",],\n}'
+    )
+    sections = (
+        "---TITLE---\n# Taming the Cluster\n\n---CONTENT---\n" + body +
+        "\n---META---\nMeta description: A witty guide.\nTags: kubernetes, devops\nExcerpt: Short.\n"
+    )
+    return body, [
+        ('clean json', clean, 'json'),
+        ('fenced json', fenced, 'json'),
+        ('broken json', broken, 'json'),
+        ('sections', sections, 'sections')
+    ]
+
+def is_intact(result, body):
+    """Whether a parse result carries the original body unmangled"""
+    return bool(result) and result.get('content', '').strip() == body.strip()
+
+def best_time(func, text, repeat):
+    """Best wall time of repeat runs, in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark structured-output parsing")
+    parser.add_argument('--sizes', default="10,100,1000", help="Comma-separated body sizes in KB")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement (best is reported)")
+    args = parser.parse_args()
+
+    print(f"{'sample':<14}{'size':>8}{'legacy ms':>12}{'new ms':>10}  legacy ok / new ok")
+    for size_kb in [int(size) for size in args.sizes.split(',') if size.strip()]:
+        body, samples = make_samples(size_kb)
+        for name, text, kind in samples:
+            if kind == 'json':
+                legacy, new = legacy_parse, lambda t: parse_json_output(t, required=('title', 'content'))
+            else:
+                legacy, new = legacy_sections, new_sections
+
+            legacy_ms = best_time(legacy, text, args.repeat)
+            new_ms = best_time(new, text, args.repeat)
+            # "ok" means the body came back exactly, not just that something parsed
+            legacy_ok = is_intact(legacy(text), body)
+            new_ok = is_intact(new(text), body)
+            print(f"{name:<14}{size_kb:>6}KB{legacy_ms:>12.2f}{new_ms:>10.2f}  {legacy_ok} / {new_ok}")
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,24 @@
-import boto3
+import argparse
+import asyncio
 import json
 import os
 import re
 import base64
-import random
-import tempfile
 from wordpress_xmlrpc import Client, WordPressPost
-from wordpress_xmlrpc.methods import posts, media
 from wordpress_xmlrpc.methods.posts import NewPost
-from wordpress_xmlrpc.compat import xmlrpc_client
+from bedrock_client import get_bedrock_client, get_bedrock_image_client
+from hedging import first_valid_response, invoke_claude_text
+from image_cache import get_image_cache, image_cache_key, seed_for_prompt
+from image_pipeline import IMAGE_CONCURRENCY, process_images_xmlrpc
+from llm_cache import add_llm_cache_arguments, configure_llm_cache, get_llm_cache
+from post_metadata import SPLIT_METADATA, resolve_metadata, submit_metadata
+from post_mirror import get_post_mirror
+from prompt_budget import format_style_examples
+from prompt_cache import check_prefix_stability, user_message
+from retry_policy import call_with_retry
+from structured_output import parse_json_output
+from style_profile import load_style_profile, style_profile_text
+from wp_client import AsyncWordPressClient, create_session
 import requests
 
 # Constants
@@ -63,11 +73,16 @@ def get_github_activity(username):
         'recent_commits': recent_commits
     }
 
-def fetch_recent_posts(wp_client, num_posts=3):
-    """Fetch recent posts from WordPress"""
+def fetch_recent_posts(credentials, num_posts=3):
+    """Return recent posts from the local post mirror, syncing it over the REST API when it's stale"""
     try:
-        recent_posts = wp_client.call(posts.GetPosts({'number': num_posts}))
-        return recent_posts
+        # Same site as the XML-RPC endpoint; within POST_MIRROR_MAX_AGE of the last
+        # sync this doesn't touch the network at all
+        api_base_url = credentials['xmlrpc_url'].replace('/xmlrpc.php', '/wp-json/wp/v2')
+        mirror = get_post_mirror(api_base_url)
+        client = AsyncWordPressClient(create_session(credentials['username'], credentials['password']), api_base_url)
+        asyncio.run(mirror.sync_if_stale(client))
+        return mirror.recent_posts(num_posts)
     except Exception as e:
         print(f"Error fetching recent posts: {e}")
         return []
@@ -77,28 +92,51 @@ def format_posts_for_analysis(recent_posts):
     formatted_posts = []
     for post in recent_posts:
         formatted_posts.append({
-            'title': post.title,
-            'content': re.sub(r'<[^>]+>', '', post.content),  # Remove HTML tags
-            'date': post.date.strftime('%Y-%m-%d'),
-            'categories': [term.name for term in post.terms],
-            'excerpt': re.sub(r'<[^>]+>', '', post.excerpt) if post.excerpt else ""
+            'title': post['title'],
+            'content': re.sub(r'<[^>]+>', '', post['content']),  # Remove HTML tags
+            'date': post['date'][:10],
+            'excerpt': re.sub(r'<[^>]+>', '', post['excerpt']) if post['excerpt'] else ""
         })
     return formatted_posts
 
-def generate_post_with_bedrock(posts_content):
+def generate_post_with_bedrock(posts_content, style_profile=None):
     """Generate a new SEO-optimized post using Amazon Bedrock's Claude model"""
-    bedrock_runtime = boto3.client(
-        service_name="bedrock-runtime",
-        region_name=AWS_REGION
-    )
+    bedrock_runtime = get_bedrock_client(AWS_REGION)
     
-    # Create a prompt for Claude
+    if style_profile:
+        # The stored profile stands in for raw examples at a fraction of the tokens
+        style_intro = "Here is a profile of my writing style, distilled from my blog's archive:"
+        recent_posts_text = style_profile_text(style_profile)
+    else:
+        # Representative paragraphs from each post, within the token budget, instead of
+        # every post in full as indented JSON
+        style_intro = "I'll provide you with some of my recent blog posts so you can understand my writing style and tone.\n\nRecent posts:"
+        recent_posts_text, _ = format_style_examples(posts_content)
+    
+    # In split mode a cheaper model writes the tags and meta description afterwards
+    if SPLIT_METADATA:
+        post_requirements = ""
+        response_format = """{
+  "title": "The title of the post",
+  "content": "The full content of the post with image placeholders"
+}"""
+    else:
+        post_requirements = """
+6. Include relevant tags (3-5) for the post
+7. Include a meta description for SEO purposes"""
+        response_format = """{
+  "title": "The title of the post",
+  "content": "The full content of the post with image placeholders",
+  "tags": ["tag1", "tag2", "tag3"],
+  "meta_description": "A compelling meta description for SEO"
+}"""
+    
+    # Nothing in this prompt changes between runs until the style profile is
+    # rebuilt, so all of it is the cacheable prefix
     prompt = f"""You are a witty, sarcastic tech blogger with a knack for explaining complex topics in an entertaining way.
 
-I'll provide you with some of my recent blog posts so you can understand my writing style and tone.
-
-Recent posts:
-{json.dumps(posts_content, indent=2)}
+{style_intro}
+{recent_posts_text}
 
 Based on my writing style, please generate a new blog post about a tech topic that would interest my readers. The post should:
 
@@ -106,192 +144,124 @@ Based on my writing style, please generate a new blog post about a tech topic th
 2. Include an engaging introduction
 3. Have well-structured sections with subheadings
 4. Include at least 2 places for images with the format [IMAGE: description of image]
-5. End with a thought-provoking conclusion
-6. Include relevant tags (3-5) for the post
-7. Include a meta description for SEO purposes
+5. End with a thought-provoking conclusion{post_requirements}
 
 Format your response as a JSON object with the following structure:
-{{
-  "title": "The title of the post",
-  "content": "The full content of the post with image placeholders",
-  "tags": ["tag1", "tag2", "tag3"],
-  "meta_description": "A compelling meta description for SEO"
-}}
+{response_format}
 
 Be creative, informative, and maintain my sarcastic, witty tone throughout the post.
 """
 
-    # Call Claude 3 Sonnet
-    response = bedrock_runtime.invoke_model(
-        modelId=MODEL_ID,
-        contentType="application/json",
-        accept="application/json",
-        body=json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 4096,
-            "temperature": 0.7,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-        })
-    )
+    check_prefix_stability('cleaned-post', prompt)
     
-    response_body = json.loads(response.get('body').read().decode('utf-8'))
-    content = response_body.get('content', [{}])[0].get('text', '')
+    request_body = {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": 4096,
+        "temperature": 0.7,
+        "messages": [
+            user_message(MODEL_ID, prompt)
+        ]
+    }
     
-    # Extract JSON from Claude's response
-    try:
-        # First, try to parse the entire response as JSON
-        post_data = json.loads(content)
-    except json.JSONDecodeError:
-        # If that fails, try to extract JSON from the text
-        try:
-            json_match = re.search(r'```json\s*(.*?)\s*```', content, re.DOTALL)
-            if json_match:
-                post_data = json.loads(json_match.group(1))
-            else:
-                # Try to find JSON without code blocks
-                json_match = re.search(r'({[\s\S]*})', content)
-                if json_match:
-                    post_data = json.loads(json_match.group(1))
-                else:
-                    raise Exception("Could not extract JSON from response")
-        except Exception as e:
-            print(f"Error extracting JSON: {e}")
-            print(f"Raw response: {content}")
-            return None
+    # Reruns with a byte-identical prompt can reuse the last response
+    llm_cache = get_llm_cache()
+    content = llm_cache.get(MODEL_ID, request_body)
+    
+    def parse(text):
+        # Extract JSON from Claude's response in one pass, fenced or not
+        return parse_json_output(text, required=('title', 'content'))
     
+    if content is not None:
+        post_data = parse(content)
+    else:
+        # Call Claude 3 Sonnet; with HEDGE_GENERATION=1 a slow or malformed
+        # response is backed up by a second request
+        content, post_data = first_valid_response(
+            lambda should_stop: invoke_claude_text(bedrock_runtime, MODEL_ID, request_body, should_stop),
+            parse,
+            MODEL_ID,
+            request_body
+        )
+    
+    if post_data is None:
+        print("Error extracting JSON from Claude's response")
+        print(f"Raw response: {content}")
+        return None
+    post_data.setdefault('tags', [])
+    post_data.setdefault('meta_description', "")
+    
+    if SPLIT_METADATA:
+        # Runs while the images render; main() waits for it before publishing
+        post_data['metadata_future'] = submit_metadata(
+            post_data['title'],
+            post_data['content'],
+            ('tags', 'meta_description'),
+            AWS_REGION
+        )
+    
+    # Only responses we could parse are worth replaying
+    llm_cache.put(MODEL_ID, request_body, content)
     return post_data
 
-def generate_image_with_bedrock(description):
+def generate_image_with_bedrock(description, deadline=None):
     """Generate an image using Amazon Bedrock's Stable Diffusion XL"""
     try:
         print(f"Starting image generation for: '{description}'")
         
-        # Create a Bedrock client
-        bedrock_runtime = boto3.client(
-            service_name="bedrock-runtime",
-            region_name=AWS_REGION
-        )
-        
         # Prepare the prompt for Stable Diffusion XL
+        image_model_id = "stability.stable-diffusion-xl-v1"
         prompt = f"Professional, high-quality image: {description}. Detailed, vibrant, magazine-quality."
+        negative_prompt = "blurry, distorted, disfigured, poor quality, low resolution"
+        seed = seed_for_prompt(image_model_id, prompt)
+        cache_key = image_cache_key(image_model_id, prompt, None, None, 9, 50, seed, negative_prompt)
         
-        # Call Stable Diffusion XL
-        response = bedrock_runtime.invoke_model(
-            modelId="stability.stable-diffusion-xl-v1",
-            contentType="application/json",
-            accept="application/json",
-            body=json.dumps({
-                "text_prompts": [
-                    {
-                        "text": prompt,
-                        "weight": 1.0
-                    },
-                    {
-                        "text": "blurry, distorted, disfigured, poor quality, low resolution",
-                        "weight": -1.0
-                    }
-                ],
-                "cfg_scale": 9,
-                "steps": 50,
-                "seed": random.randint(0, 4294967295)
-            })
-        )
-        
-        # Process the response
-        response_body = json.loads(response.get('body').read().decode('utf-8'))
-        
-        # Get the base64 encoded image
-        if 'artifacts' in response_body and len(response_body['artifacts']) > 0:
-            image_b64 = response_body['artifacts'][0]['base64']
+        def render():
+            bedrock_runtime = get_bedrock_image_client(AWS_REGION, deadline)
+            # Call Stable Diffusion XL
+            response = bedrock_runtime.invoke_model(
+                modelId=image_model_id,
+                contentType="application/json",
+                accept="application/json",
+                body=json.dumps({
+                    "text_prompts": [
+                        {
+                            "text": prompt,
+                            "weight": 1.0
+                        },
+                        {
+                            "text": negative_prompt,
+                            "weight": -1.0
+                        }
+                    ],
+                    "cfg_scale": 9,
+                    "steps": 50,
+                    "seed": seed
+                })
+            )
             
-            # Save the image to a temporary file
-            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
-                temp_file.write(base64.b64decode(image_b64))
-                return temp_file.name
-        else:
+            # Process the response
+            response_body = json.loads(response.get('body').read().decode('utf-8'))
+            
+            # Get the base64 encoded image
+            if 'artifacts' in response_body and len(response_body['artifacts']) > 0:
+                return base64.b64decode(response_body['artifacts'][0]['base64'])
             print("No image generated in the response")
             return None
-    except Exception as e:
-        print(f"Error generating image: {e}")
-        return None
-
-def upload_image_to_wordpress(wp_client, image_path, description):
-    """Upload an image to WordPress and return the attachment ID"""
-    try:
-        # Prepare image data
-        with open(image_path, 'rb') as img:
-            image_data = img.read()
         
-        # Prepare the media item
-        filename = os.path.basename(image_path)
-        data = {
-            'name': f"{description[:50]}.png",
-            'type': 'image/png',
-            'bits': xmlrpc_client.Binary(image_data),
-            'caption': description
-        }
-        
-        # Upload the image
-        response = wp_client.call(media.UploadFile(data))
-        return response
+        # Serve reruns of the same prompt from the on-disk cache, keeping the PNG in memory;
+        # fresh renders go through the shared retry policy
+        return get_image_cache().get_or_render(
+            cache_key,
+            lambda: call_with_retry(render, image_model_id, deadline)
+        )
     except Exception as e:
-        print(f"Error uploading image: {e}")
+        print(f"Error generating image: {e}")
         return None
 
-def process_image_placeholders(wp_client, content):
+def process_image_placeholders(credentials, content, max_workers=IMAGE_CONCURRENCY):
     """Process image placeholders in the content and replace with actual images"""
-    # Define patterns for image placeholders
-    patterns = [
-        r'\[IMAGE:\s*(.*?)\]',  # [IMAGE: description]
-        r'\[image:\s*(.*?)\]',  # [image: description]
-        r'\{\{IMAGE:\s*(.*?)\}\}',  # {{IMAGE: description}}
-        r'\{\{image:\s*(.*?)\}\}'   # {{image: description}}
-    ]
-    
-    # Process each pattern
-    for pattern in patterns:
-        matches = re.findall(pattern, content)
-        for description in matches:
-            # Try to generate an image up to 2 times
-            image_path = None
-            for attempt in range(2):
-                image_path = generate_image_with_bedrock(description)
-                if image_path:
-                    break
-                print(f"Retrying image generation for: {description}")
-            
-            if image_path:
-                # Upload the image to WordPress
-                response = upload_image_to_wordpress(wp_client, image_path, description)
-                if response:
-                    # Replace the placeholder with the image HTML
-                    img_url = response['url']
-                    img_html = f'<img src="{img_url}" alt="{description}" class="wp-image-{response["id"]}" />'
-                    content = re.sub(pattern.replace('(.*?)', re.escape(description)), img_html, content, 1)
-                    
-                    # Clean up the temporary file
-                    os.unlink(image_path)
-                else:
-                    # If upload fails, replace with a message
-                    content = re.sub(pattern.replace('(.*?)', re.escape(description)), 
-                                    f'<p><em>Image generation failed for: {description}</em></p>', content, 1)
-            else:
-                # If generation fails, replace with a witty message
-                witty_messages = [
-                    f"<p><em>The AI tried to draw '{description}' but apparently it skipped art class that day.</em></p>",
-                    f"<p><em>Image of '{description}' not available. The AI artist is currently experiencing creative differences with reality.</em></p>",
-                    f"<p><em>We asked for an image of '{description}' but the AI was too busy contemplating the meaning of pixels.</em></p>",
-                    f"<p><em>Image generation for '{description}' failed. Our AI illustrator is taking an unexpected coffee break.</em></p>"
-                ]
-                content = re.sub(pattern.replace('(.*?)', re.escape(description)), 
-                                random.choice(witty_messages), content, 1)
-    
-    return content
+    # Renders overlap uploads, and every image is resized and deduplicated before it goes up
+    return process_images_xmlrpc(content, credentials, generate_image_with_bedrock, 'ai-generated', max_workers)
 
 def publish_post_to_wordpress(wp_client, post_data):
     """Publish the generated post to WordPress"""
@@ -324,6 +294,10 @@ def publish_post_to_wordpress(wp_client, post_data):
 
 def main():
     """Main function to generate and publish a post"""
+    parser = argparse.ArgumentParser(description="Generate a post in the style of recent posts and publish it to WordPress")
+    add_llm_cache_arguments(parser)
+    configure_llm_cache(parser.parse_args())
+    
     # Load WordPress credentials
     credentials = get_wp_credentials()
     if not credentials:
@@ -337,25 +311,34 @@ def main():
         print(f"Error connecting to WordPress: {e}")
         return
     
-    # Fetch recent posts
-    recent_posts = fetch_recent_posts(wp_client)
-    if not recent_posts:
-        print("No recent posts found")
-        return
-    
-    # Format posts for analysis
-    formatted_posts = format_posts_for_analysis(recent_posts)
+    # A stored style profile makes fetching recent posts unnecessary
+    style_profile = load_style_profile(credentials['xmlrpc_url'].replace('/xmlrpc.php', '/wp-json/wp/v2'))
+    if style_profile:
+        print(f"Using style profile built from {style_profile['post_count']} posts")
+        formatted_posts = []
+    else:
+        # Fetch recent posts
+        recent_posts = fetch_recent_posts(credentials)
+        if not recent_posts:
+            print("No recent posts found")
+            return
+        
+        # Format posts for analysis
+        formatted_posts = format_posts_for_analysis(recent_posts)
     
     # Generate a new post
     print("Generating new post with Claude 3 Sonnet...")
-    post_data = generate_post_with_bedrock(formatted_posts)
+    post_data = generate_post_with_bedrock(formatted_posts, style_profile)
     if not post_data:
         print("Failed to generate post")
         return
     
     # Process image placeholders
     print("Processing image placeholders...")
-    post_data['content'] = process_image_placeholders(wp_client, post_data['content'])
+    post_data['content'] = process_image_placeholders(credentials, post_data['content'])
+    
+    # In split mode the metadata model has been working while the images rendered
+    resolve_metadata(post_data)
     
     # Publish the post
     print("Publishing post to WordPress...")
@@ -0,0 +1,220 @@
+"""
+Image Pipeline
+--------------
+Helpers for rendering every image placeholder in a post at once instead of
+one Bedrock round trip after another, with uploads overlapping generation.
+process_images_xmlrpc() is the whole placeholder-to-figure step the XML-RPC
+generators share; they only differ in how they render and name their images.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from image_cache import get_image_cache
+from placeholders import find_placeholders, replace_placeholders
+from retry_policy import Deadline
+
+# How many images we are willing to render at the same time
+IMAGE_CONCURRENCY = int(os.environ.get("IMAGE_CONCURRENCY", "3"))
+
+# How many uploads drain the queue of finished renders
+UPLOAD_CONCURRENCY = int(os.environ.get("UPLOAD_CONCURRENCY", "1"))
+
+def map_bounded(worker, items, max_workers=None):
+    """Run worker over items with a bounded thread pool, returning results in input order"""
+    items = list(items)
+    if not items:
+        return []
+
+    if max_workers is None:
+        max_workers = IMAGE_CONCURRENCY
+    max_workers = max(1, min(max_workers, len(items)))
+
+    # A single worker is just the old sequential loop, no need for a pool
+    if max_workers == 1:
+        return [worker(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-worker") as executor:
+        # executor.map yields results in the order the items were submitted
+        return list(executor.map(worker, items))
+
+def generate_then_upload(items, generate, upload, max_workers=None, upload_workers=None):
+    """Generate every item on one pool and upload each render as soon as it finishes
+
+    generate(item) returns a render (or None on failure) and upload(item, render)
+    returns the final result. Results come back in input order once every
+    upload has resolved, so wall time is roughly the slowest render plus the
+    last upload rather than the sum of every step.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    if max_workers is None:
+        max_workers = IMAGE_CONCURRENCY
+    if upload_workers is None:
+        upload_workers = UPLOAD_CONCURRENCY
+    max_workers = max(1, min(max_workers, len(items)))
+    upload_workers = max(1, min(upload_workers, len(items)))
+
+    def safe_generate(item):
+        try:
+            return generate(item)
+        except Exception as e:
+            print(f"Error generating image: {e}")
+            return None
+
+    upload_futures = [None] * len(items)
+    with ThreadPoolExecutor(max_workers=upload_workers, thread_name_prefix="upload-worker") as upload_pool:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-worker") as generate_pool:
+            generate_futures = {generate_pool.submit(safe_generate, item): i for i, item in enumerate(items)}
+
+            # Queue each upload the moment its render is ready, whatever order they finish in
+            for future in as_completed(generate_futures):
+                i = generate_futures[future]
+                upload_futures[i] = upload_pool.submit(upload, items[i], future.result())
+
+        return [future.result() for future in upload_futures]
+
+def thread_local_factory(factory):
+    """Wrap a client factory so each worker thread builds and reuses its own client"""
+    local = threading.local()
+
+    def get_client():
+        if not hasattr(local, 'client'):
+            local.client = factory()
+        return local.client
+
+    return get_client
+
+class RenderPrefetcher:
+    """Starts renders in the background as soon as their keys are known
+
+    prefetch(key) queues render(key) on a bounded pool; get(key) waits for that
+    render, or runs it on the spot if nobody asked for it in advance. Each key
+    is rendered at most once.
+    """
+
+    def __init__(self, render, max_workers=None):
+        self.render = render
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, max_workers or IMAGE_CONCURRENCY),
+            thread_name_prefix="prefetch-worker"
+        )
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def prefetch(self, key):
+        """Start rendering key in the background unless it is already under way"""
+        with self._lock:
+            if key not in self._futures:
+                self._futures[key] = self._pool.submit(self.render, key)
+
+    def get(self, key):
+        """Return the render for key, waiting for a prefetch or rendering it now"""
+        self.prefetch(key)
+        return self._futures[key].result()
+
+    def shutdown(self):
+        """Drop renders that never started and wait for the running ones"""
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+def upload_placeholder_image(get_wp, placeholder, image_data, base_name):
+    """Upload a finished render for a placeholder over XML-RPC, returning the HTML to splice in"""
+    # Imported here so the REST script doesn't need python-wordpress-xmlrpc or Pillow to use the pool helpers
+    from image_processing import prepare_image, srcset_attributes
+    from media_upload import upload_media_xmlrpc
+
+    description = placeholder['description']
+    fallback_html = f'<p><em>Image description: {description}</em></p>'
+
+    if not image_data:
+        print(f"Failed to generate image for '{description}', using placeholder text instead")
+        # Replace with a text note since image generation failed
+        return fallback_html
+
+    print(f"Image generated successfully ({len(image_data)} bytes)")
+    try:
+        # Shrink the render and build any responsive variants before uploading
+        variants = prepare_image(image_data)
+
+        # Upload to WordPress straight from memory, full size first; the
+        # content hash upload_media_xmlrpc appends keeps the filenames apart
+        print(f"Uploading image for '{description}' to WordPress...")
+        sources = []
+        for variant in variants:
+            suffix = f"-{variant['width']}w" if sources else ""
+            response = upload_media_xmlrpc(
+                get_wp(),
+                variant['data'],
+                f"{base_name}{suffix}.{variant['extension']}",
+                variant['mime_type'],
+                caption=description
+            )
+            sources.append((response['url'], variant['width']))
+        img_url = sources[0][0]
+        print(f"Image uploaded successfully, URL: {img_url}")
+
+        # Replace placeholder with actual image HTML
+        return f'<figure class="wp-block-image"><img src="{img_url}"{srcset_attributes(sources)} alt="{description}"/><figcaption>{description}</figcaption></figure>'
+    except Exception as e:
+        print(f"Error uploading image to WordPress: {e}")
+        # Replace with a text note since upload failed
+        return fallback_html
+
+def process_images_xmlrpc(content, credentials, generate_image, base_name, max_workers=None):
+    """Render every image placeholder in content, upload the images over XML-RPC and splice them in
+
+    generate_image(description, deadline) returns PNG bytes or None; uploaded
+    files are named after base_name.
+    """
+    from wordpress_xmlrpc import Client
+
+    # XML-RPC connections aren't thread-safe, so every worker gets its own WordPress client
+    get_wp = thread_local_factory(lambda: Client(
+        credentials['xmlrpc_url'],
+        credentials['username'],
+        credentials['password']
+    ))
+
+    # Collect every placeholder, whatever syntax it uses, in one pass
+    placeholders = find_placeholders(content)
+
+    print(f"Found {len(placeholders)} total image placeholders")
+
+    # A description that appears more than once is rendered and uploaded once,
+    # and every occurrence gets the same figure
+    first_placeholders = {}
+    for placeholder in placeholders:
+        first_placeholders.setdefault(placeholder['description'], placeholder)
+    unique_placeholders = list(first_placeholders.values())
+
+    def generate(placeholder):
+        print(f"Processing image placeholder: '{placeholder['full_match']}'")
+        return generate_image(placeholder['description'], deadline)
+
+    # Render every placeholder at once, bounded by max_workers, and upload each
+    # image while the rest are still rendering. Once the time budget for this
+    # post runs out, remaining placeholders fall back to text.
+    if max_workers is None:
+        max_workers = IMAGE_CONCURRENCY
+    print(f"Rendering images with up to {max_workers} concurrent workers")
+    deadline = Deadline()
+    figures = generate_then_upload(
+        unique_placeholders,
+        generate,
+        lambda placeholder, image_data: upload_placeholder_image(get_wp, placeholder, image_data, base_name),
+        max_workers
+    )
+    figure_by_description = {
+        placeholder['description']: figure
+        for placeholder, figure in zip(unique_placeholders, figures)
+    }
+    replacements = [figure_by_description[placeholder['description']] for placeholder in placeholders]
+
+    cache_stats = get_image_cache().stats()
+    print(f"Image cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+
+    # Splice the results back in document order
+    return replace_placeholders(content, placeholders, replacements)
@@ -0,0 +1,111 @@
+"""
+Image Processing
+----------------
+Turns raw model output into something fit for the web before it's uploaded:
+WebP or progressive JPEG inside a byte budget, no metadata, and optionally a
+few narrower variants for a responsive srcset.
+"""
+
+import io
+import os
+
+from PIL import Image
+
+# Output format ("webp" or "jpeg") and the most bytes we want to ship per image
+IMAGE_FORMAT = os.environ.get("IMAGE_FORMAT", "webp").lower()
+IMAGE_MAX_KB = int(os.environ.get("IMAGE_MAX_KB", "150"))
+
+# Comma-separated widths for responsive variants, e.g. "320,768"; empty means none
+IMAGE_VARIANT_WIDTHS = [
+    int(width) for width in os.environ.get("IMAGE_VARIANT_WIDTHS", "").split(",") if width.strip()
+]
+
+# Quality ladder to walk down before we start shrinking the image instead
+QUALITY_STEPS = [85, 75, 65, 55, 45]
+MIN_SCALE = 0.5
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', 'webp'),
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg'),
+    'jpg': ('JPEG', 'image/jpeg', 'jpg')
+}
+
+def load_image(data):
+    """Open image bytes (or pass through a PIL image) as a metadata-free RGB image"""
+    image = data if isinstance(data, Image.Image) else Image.open(io.BytesIO(data))
+    # convert() gives us a fresh image; dropping info strips EXIF, ICC and PNG text chunks
+    image = image.convert('RGB')
+    image.info = {}
+    return image
+
+def encode(image, image_format, quality):
+    """Encode an RGB image once with web-friendly settings"""
+    pil_format = FORMATS[image_format][0]
+    buffer = io.BytesIO()
+    if pil_format == 'JPEG':
+        image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, 'WEBP', quality=quality, method=6)
+    return buffer.getvalue()
+
+def transcode(image, image_format=None, max_bytes=None):
+    """Encode an image within the byte budget, returning a variant dict"""
+    image_format = (image_format or IMAGE_FORMAT).lower()
+    if image_format not in FORMATS:
+        print(f"Unknown image format '{image_format}', falling back to jpeg")
+        image_format = 'jpeg'
+    if max_bytes is None:
+        max_bytes = IMAGE_MAX_KB * 1024
+    _, mime_type, extension = FORMATS[image_format]
+
+    scale = 1.0
+    candidate = image
+    while True:
+        for quality in QUALITY_STEPS:
+            data = encode(candidate, image_format, quality)
+            if len(data) <= max_bytes:
+                break
+        else:
+            # Even the lowest quality is too big, so give up some pixels instead
+            if scale * 0.8 >= MIN_SCALE:
+                scale *= 0.8
+                size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+                candidate = image.resize(size, Image.LANCZOS)
+                continue
+            print(f"Image still {len(data)} bytes at minimum quality and scale, shipping it anyway")
+
+        return {
+            'width': candidate.width,
+            'data': data,
+            'mime_type': mime_type,
+            'extension': extension
+        }
+
+def prepare_image(data, widths=None, image_format=None, max_bytes=None):
+    """Transcode an image plus any narrower variants, full size first"""
+    image = load_image(data)
+    if widths is None:
+        widths = IMAGE_VARIANT_WIDTHS
+
+    variants = [transcode(image, image_format, max_bytes)]
+
+    # Only widths narrower than the full-size rendition are worth shipping
+    for width in sorted(set(widths), reverse=True):
+        if width >= variants[0]['width']:
+            continue
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+        variants.append(transcode(resized, image_format, max_bytes))
+
+    original_size = len(data) if isinstance(data, (bytes, bytearray)) else None
+    if original_size:
+        print(f"Transcoded image from {original_size} to {len(variants[0]['data'])} bytes ({variants[0]['mime_type']})")
+    return variants
+
+def srcset_attributes(sources):
+    """Build the srcset/sizes attributes for a list of (url, width) pairs, widest first"""
+    if len(sources) < 2:
+        return ""
+    srcset = ", ".join(f"{url} {width}w" for url, width in sources)
+    widest = sources[0][1]
+    return f' srcset="{srcset}" sizes="(max-width: {widest}px) 100vw, {widest}px"'
@@ -0,0 +1,172 @@
+"""
+LLM Cache
+---------
+An opt-in on-disk cache for Claude responses, keyed on the model ID and the
+exact request (prompt and sampling parameters). CronJob retries after a failed
+publish, debugging reruns and local testing get the same post back instead of
+paying for another full generation. Entries expire after a TTL and the cache
+is kept under a size cap, least recently used first.
+
+Enable it with LLM_CACHE=1 or --cache; --no-cache skips it for one run and
+--refresh ignores what's cached but stores the new response.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE", "0") == "1"
+CACHE_DIR = os.environ.get("AI_BUTLER_CACHE_DIR", os.path.expanduser("~/.cache/ai-butler"))
+
+LLM_CACHE_DIR = os.environ.get("LLM_CACHE_DIR", os.path.join(CACHE_DIR, "llm"))
+# A cached post is only useful for retries of the same run or a debugging session
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_MAX_MB = int(os.environ.get("LLM_CACHE_MAX_MB", "32"))
+
+def llm_cache_key(model_id, request_body):
+    """Fingerprint a model call from the model ID and the full request body"""
+    # sort_keys makes the fingerprint independent of how the dict was built
+    fingerprint = json.dumps({'model_id': model_id, 'request': request_body}, sort_keys=True)
+    return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+
+class LLMCache:
+    """TTL and size bounded cache of model responses, one JSON file per key"""
+
+    def __init__(self, cache_dir=LLM_CACHE_DIR, ttl=LLM_CACHE_TTL, max_bytes=LLM_CACHE_MAX_MB * 1024 * 1024,
+                 enabled=LLM_CACHE_ENABLED, refresh=False):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.refresh = refresh
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read(self, key):
+        # Returns the entry if it exists and is younger than the TTL
+        try:
+            with open(self._path(key), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get('created_at', 0) > self.ttl:
+            return None
+        return entry
+
+    def get(self, model_id, request_body):
+        """Return the cached response text for this call, or None"""
+        if not self.enabled or self.refresh:
+            return None
+
+        key = llm_cache_key(model_id, request_body)
+        entry = self._read(key)
+        if entry is None:
+            return None
+
+        # Touch the file so eviction sees it as recently used
+        try:
+            os.utime(self._path(key), None)
+        except OSError:
+            pass
+        print(f"LLM cache hit for {model_id} ({key[:12]}), skipping the model call")
+        return entry['text']
+
+    def put(self, model_id, request_body, text):
+        """Store a response that parsed successfully, unless a fresh copy is already cached"""
+        if not self.enabled or not text:
+            return
+
+        key = llm_cache_key(model_id, request_body)
+        # A cache hit shouldn't push its own expiry further out
+        if not self.refresh and self._read(key) is not None:
+            return
+
+        entry = {'created_at': time.time(), 'model_id': model_id, 'text': text}
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            print(f"Error writing LLM cache entry {key[:12]}: {e}")
+            return
+
+        self.evict()
+
+    def evict(self):
+        """Delete expired entries, then least recently used ones until under max_bytes"""
+        with self._lock:
+            try:
+                names = os.listdir(self.cache_dir)
+            except OSError:
+                return
+
+            now = time.time()
+            entries = []
+            total = 0
+            for name in names:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                # mtime is refreshed on every hit, so anything this old can't be fresh
+                if now - stat.st_mtime > self.ttl:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache():
+    """Return the process-wide LLM response cache"""
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMCache()
+        return _llm_cache
+
+def add_llm_cache_arguments(parser):
+    """Add --cache, --no-cache and --refresh to an argparse parser"""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--cache', dest='llm_cache', action='store_const', const='on',
+                       help="Reuse cached Claude responses for identical prompts (same as LLM_CACHE=1)")
+    group.add_argument('--no-cache', dest='llm_cache', action='store_const', const='off',
+                       help="Always call Claude and don't store the response")
+    group.add_argument('--refresh', dest='llm_cache', action='store_const', const='refresh',
+                       help="Call Claude even if a response is cached, then replace the cached copy")
+
+def configure_llm_cache(args):
+    """Apply the cache flags parsed by add_llm_cache_arguments"""
+    cache = get_llm_cache()
+    if args.llm_cache == 'on':
+        cache.enabled = True
+    elif args.llm_cache == 'off':
+        cache.enabled = False
+    elif args.llm_cache == 'refresh':
+        cache.enabled = True
+        cache.refresh = True
+    return cache
@@ -0,0 +1,259 @@
+"""
+Post Mirror
+-----------
+A local SQLite copy of the blog archive. It syncs incrementally: only posts
+modified since the last sync are fetched (modified_after, oldest change
+first, stored by ID so overlapping reads are harmless), and not at all if
+the last sync is recent enough. A mirror that has never synced starts from
+the newest published posts rather than the whole archive. The generators
+read recent posts from here instead of asking WordPress on every run, and
+the style profile is distilled from it. `python post_mirror.py sync [--full]`
+brings it up to date by hand.
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import requests
+
+CACHE_DIR = os.environ.get("AI_BUTLER_CACHE_DIR", os.path.expanduser("~/.cache/ai-butler"))
+
+POST_MIRROR_PATH = os.environ.get("POST_MIRROR_PATH", os.path.join(CACHE_DIR, "posts.sqlite3"))
+
+# A mirror synced this recently is used as is, without asking WordPress
+POST_MIRROR_MAX_AGE = int(os.environ.get("POST_MIRROR_MAX_AGE", "3600"))
+
+# Newest published posts the first sync of an empty mirror fetches
+POST_MIRROR_INITIAL_POSTS = int(os.environ.get("POST_MIRROR_INITIAL_POSTS", "50"))
+
+# modified_after is strict and only has second precision, so each sync
+# re-reads a little of the last one rather than risk missing a post
+SYNC_OVERLAP = timedelta(seconds=60)
+
+POST_FIELDS = 'id,date,modified_gmt,status,link,title,content,excerpt,tags,categories'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    site TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    date TEXT,
+    modified_gmt TEXT,
+    status TEXT,
+    link TEXT,
+    title TEXT,
+    content TEXT,
+    excerpt TEXT,
+    tags TEXT,
+    categories TEXT,
+    PRIMARY KEY (site, id)
+);
+CREATE INDEX IF NOT EXISTS posts_by_date ON posts (site, status, date);
+CREATE TABLE IF NOT EXISTS sync_state (
+    site TEXT PRIMARY KEY,
+    synced_at REAL,
+    modified_gmt TEXT,
+    max_id INTEGER
+);
+"""
+
+class PostMirror:
+    """Local copy of one site's posts, kept in SQLite"""
+
+    def __init__(self, site, path=POST_MIRROR_PATH):
+        self.site = site
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(SCHEMA)
+
+    def sync_state(self):
+        """Return when and up to which modification time the mirror was last synced"""
+        with self._lock:
+            row = self._db.execute("SELECT * FROM sync_state WHERE site = ?", (self.site,)).fetchone()
+        return dict(row) if row else {'synced_at': 0, 'modified_gmt': None, 'max_id': 0}
+
+    def _store(self, items):
+        rows = [(
+            self.site,
+            item['id'],
+            item['date'],
+            item['modified_gmt'],
+            item['status'],
+            item['link'],
+            item['title']['rendered'],
+            item['content']['rendered'],
+            item['excerpt']['rendered'],
+            json.dumps(item.get('tags', [])),
+            json.dumps(item.get('categories', []))
+        ) for item in items]
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO posts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    async def sync(self, client, full=False, initial_posts=POST_MIRROR_INITIAL_POSTS):
+        """Fetch posts modified since the last sync and store them
+
+        A mirror that has never synced fetches only the newest initial_posts
+        published posts; full=True fetches every post instead. Returns the
+        number of changed posts and how many of them are new.
+        """
+        state = self.sync_state()
+        params = {
+            # Drafts and trashed posts come along too, so unpublishing is mirrored
+            'status': 'publish,future,draft,pending,private,trash',
+            'orderby': 'modified',
+            'order': 'asc',
+            '_fields': POST_FIELDS
+        }
+        limit = None
+        if state['modified_gmt'] and not full:
+            since = datetime.fromisoformat(state['modified_gmt']) - SYNC_OVERLAP
+            # The cursor is UTC; without the offset WordPress reads it as site-local time
+            params['modified_after'] = since.strftime('%Y-%m-%dT%H:%M:%S') + '+00:00'
+        elif not full:
+            # Older posts come in as they change, or with a full sync
+            params.update(status='publish', orderby='date', order='desc', per_page=min(initial_posts, 100))
+            limit = initial_posts
+
+        changed = 0
+        new = 0
+        newest_modified = None if full else state['modified_gmt']
+        max_id = 0 if full else state['max_id'] or 0
+        seen = set()
+
+        def store(items):
+            nonlocal changed, new, newest_modified, max_id
+            self._store(items)
+            changed += len(items)
+            for item in items:
+                seen.add(item['id'])
+                # IDs only go up, so anything past the last one we saw is a new post
+                if item['id'] > (state['max_id'] or 0):
+                    new += 1
+                newest_modified = max(newest_modified or item['modified_gmt'], item['modified_gmt'])
+                max_id = max(max_id, item['id'])
+
+        while True:
+            try:
+                batch = []
+                # Pages after the first are fetched concurrently and handed out in order
+                async with contextlib.aclosing(client.iter_collection('posts', **params)) as items:
+                    async for item in items:
+                        batch.append(item)
+                        if len(batch) == 100:
+                            store(batch)
+                            batch = []
+                        if limit is not None and changed + len(batch) >= limit:
+                            break
+                store(batch)
+                break
+            except requests.HTTPError as e:
+                if params['status'] == 'publish' or e.response is None or e.response.status_code not in (400, 401, 403):
+                    raise
+                # Users who can't read drafts and trash still get the published posts
+                print("Can't read unpublished posts, mirroring published posts only")
+                params['status'] = 'publish'
+
+        with self._lock, self._db:
+            if full:
+                # Whatever the full listing didn't return has been deleted from the site
+                known = [row[0] for row in self._db.execute("SELECT id FROM posts WHERE site = ?", (self.site,))]
+                self._db.executemany(
+                    "DELETE FROM posts WHERE site = ? AND id = ?",
+                    [(self.site, post_id) for post_id in known if post_id not in seen]
+                )
+            self._db.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?)",
+                (self.site, time.time(), newest_modified, max_id)
+            )
+        return changed, new
+
+    async def sync_if_stale(self, client, max_age=POST_MIRROR_MAX_AGE):
+        """Sync unless the last sync is younger than max_age seconds; never raises"""
+        state = self.sync_state()
+        age = time.time() - state['synced_at']
+        if age < max_age:
+            print(f"Post mirror synced {age / 60:.0f} minutes ago, using it as is")
+            return 0
+        try:
+            changed, new = await self.sync(client)
+            print(f"Post mirror synced: {changed} changed posts, {new} of them new")
+            return changed
+        except Exception as e:
+            print(f"Error syncing post mirror, using the local copy: {e}")
+            return 0
+
+    def recent_posts(self, limit=5):
+        """Return up to limit published posts, newest first, as dicts of rendered fields"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM posts WHERE site = ? AND status = 'publish' ORDER BY date DESC LIMIT ?",
+                (self.site, limit)
+            ).fetchall()
+        posts = []
+        for row in rows:
+            post = dict(row)
+            del post['site']
+            post['tags'] = json.loads(post['tags'] or '[]')
+            # IDs, not the names format_style_examples expects under 'categories'
+            post['category_ids'] = json.loads(post.pop('categories') or '[]')
+            posts.append(post)
+        return posts
+
+    def count(self):
+        """Number of published posts in the mirror"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM posts WHERE site = ? AND status = 'publish'", (self.site,)
+            ).fetchone()[0]
+
+_mirrors = {}
+_mirrors_lock = threading.Lock()
+
+def get_post_mirror(site):
+    """Return the process-wide post mirror for a site"""
+    with _mirrors_lock:
+        if site not in _mirrors:
+            _mirrors[site] = PostMirror(site)
+        return _mirrors[site]
+
+def main():
+    """Sync the post mirror for the blog in blog-credentials.json"""
+    import argparse
+    from wp_client import AsyncWordPressClient, create_session
+
+    parser = argparse.ArgumentParser(description="Keep a local copy of the blog archive in sync")
+    parser.add_argument('command', choices=['sync', 'stats'], help="sync the mirror, or show what it holds")
+    parser.add_argument('--credentials', default='blog-credentials.json', help="Path to the credentials file")
+    parser.add_argument('--full', action='store_true', help="Fetch every post instead of only changed ones")
+    args = parser.parse_args()
+
+    with open(args.credentials, 'r') as f:
+        credentials = json.load(f)
+
+    # Same site URL handling as the REST client
+    site_url = credentials.get('site_url') or credentials['xmlrpc_url'].replace('/xmlrpc.php', '')
+    api_base_url = f"{site_url.rstrip('/')}/wp-json/wp/v2"
+    mirror = get_post_mirror(api_base_url)
+
+    if args.command == 'sync':
+        client = AsyncWordPressClient(create_session(credentials['username'], credentials['password']), api_base_url)
+        changed, new = asyncio.run(mirror.sync(client, full=args.full))
+        print(f"Synced {changed} changed posts, {new} of them new")
+
+    state = mirror.sync_state()
+    print(f"{mirror.count()} published posts, newest ID {state['max_id']}, last modified {state['modified_gmt']}, "
+          f"last synced {time.strftime('%Y-%m-%d %H:%M', time.localtime(state['synced_at'])) if state['synced_at'] else 'never'}")
+
+if __name__ == "__main__":
+    main()
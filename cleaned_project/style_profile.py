@@ -0,0 +1,263 @@
+"""
+Style Profile
+-------------
+Distills the blog archive into a compact description of how the author writes
+(tone markers, structure, recurring phrases, typical length, a few openings
+and sign-offs) and keeps it on disk. The generators send this profile instead
+of thousands of tokens of raw posts, and no longer fetch recent posts on every
+run; `python style_profile.py build` refreshes it from the local post mirror
+when new posts appear.
+"""
+
+import asyncio
+import collections
+import html
+import json
+import os
+import re
+import statistics
+import tempfile
+import time
+
+from post_mirror import get_post_mirror
+
+CACHE_DIR = os.environ.get("AI_BUTLER_CACHE_DIR", os.path.expanduser("~/.cache/ai-butler"))
+
+STYLE_PROFILE_PATH = os.environ.get("STYLE_PROFILE_PATH", os.path.join(CACHE_DIR, "style-profile.json"))
+
+# How much of the archive the profile is distilled from
+STYLE_PROFILE_POSTS = int(os.environ.get("STYLE_PROFILE_POSTS", "50"))
+
+PROFILE_VERSION = 1
+
+TAG = re.compile(r'<[^>]+>')
+BLOCK_TAG = re.compile(r'</?(?:p|h[1-6]|li|ul|ol|div|br|blockquote|figure|figcaption|pre|table|tr)\b[^>]*>', re.IGNORECASE)
+PHRASE_BREAK = re.compile(r'[.!?;:,()\n]+')
+HEADING = re.compile(r'<h[2-4][^>]*>|^#{2,4}\s', re.MULTILINE)
+LIST_ITEM = re.compile(r'<li[\s>]|^\s*(?:[-*]|\d+\.)\s', re.MULTILINE)
+IMAGE = re.compile(r'<img\s|\[(?:IMAGE|Image|image):')
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+WORD = re.compile(r"[A-Za-z][A-Za-z']*")
+CONTRACTION = re.compile(r"\b\w+'(?:s|re|ve|ll|d|t|m)\b", re.IGNORECASE)
+
+# Words too common to make a phrase characteristic on their own
+STOPWORDS = set("""
+a an the and or but if then so of to in on at by for with from as is are was were be been
+being it its this that these those i you we they he she my your our their me us them do does
+did not no can will just than too very into about over out up what which who how when where
+""".split())
+
+FIRST_PERSON = {'i', "i'm", "i've", "i'd", "i'll", 'me', 'my', 'mine'}
+SECOND_PERSON = {'you', "you're", "you've", "you'll", "you'd", 'your', 'yours'}
+
+def plain_text(content):
+    """Strip HTML and entities from rendered post content"""
+    # Block elements become line breaks so paragraphs don't run into each other
+    return html.unescape(TAG.sub('', BLOCK_TAG.sub('\n', content)))
+
+def first_sentence(text):
+    """Return the first sentence of text, trimmed to a sane length"""
+    text = " ".join(text.split())
+    sentence = SENTENCE_END.split(text, 1)[0] if text else ""
+    return sentence[:200]
+
+def last_sentence(text):
+    """Return the last sentence of text, trimmed to a sane length"""
+    sentences = SENTENCE_END.split(" ".join(text.split()))
+    return sentences[-1][:200] if sentences and sentences[-1] else ""
+
+def common_phrases(texts, limit=15):
+    """Return the most frequent two- and three-word phrases that aren't just filler"""
+    counts = collections.Counter()
+    # Phrases don't run across punctuation or paragraph breaks
+    for fragment in (fragment for text in texts for fragment in PHRASE_BREAK.split(text)):
+        words = [word.lower() for word in WORD.findall(fragment)]
+        for size in (2, 3):
+            for i in range(len(words) - size + 1):
+                phrase = words[i:i + size]
+                # Phrases that start or end on a filler word are rarely distinctive
+                if phrase[0] in STOPWORDS or phrase[-1] in STOPWORDS:
+                    continue
+                counts[" ".join(phrase)] += 1
+    return [phrase for phrase, count in counts.most_common(limit) if count >= 3]
+
+def quartiles(values):
+    """Return (low, median, high) quartiles, tolerating short lists"""
+    if len(values) < 2:
+        value = values[0] if values else 0
+        return value, value, value
+    low, median, high = statistics.quantiles(values, n=4)
+    return round(low), round(median), round(high)
+
+def build_style_profile(posts):
+    """Distill posts ({'id', 'date', 'title', 'content'} dicts, newest first) into a style profile"""
+    texts = []
+    word_counts = []
+    headings = []
+    list_items = []
+    images = []
+    sentence_lengths = []
+    tone = collections.Counter()
+    total_words = 0
+
+    for post in posts:
+        raw = post.get('content', '')
+        text = plain_text(raw)
+        words = [word.lower() for word in WORD.findall(text)]
+        if not words:
+            continue
+
+        texts.append(text)
+        word_counts.append(len(words))
+        headings.append(len(HEADING.findall(raw)))
+        list_items.append(len(LIST_ITEM.findall(raw)))
+        images.append(len(IMAGE.findall(raw)))
+        sentences = [s for s in SENTENCE_END.split(" ".join(text.split())) if s]
+        sentence_lengths.extend(len(WORD.findall(sentence)) for sentence in sentences)
+
+        total_words += len(words)
+        tone['first_person'] += sum(1 for word in words if word in FIRST_PERSON)
+        tone['second_person'] += sum(1 for word in words if word in SECOND_PERSON)
+        tone['contractions'] += len(CONTRACTION.findall(text))
+        tone['questions'] += text.count('?')
+        tone['exclamations'] += text.count('!')
+
+    if not texts:
+        return None
+
+    titles = [html.unescape(post.get('title', '')) for post in posts if post.get('title')]
+    per_thousand = {name: round(count * 1000 / total_words, 1) for name, count in tone.items()}
+    newest = posts[0]
+
+    return {
+        'version': PROFILE_VERSION,
+        'built_at': time.time(),
+        'post_count': len(texts),
+        'newest_post': {'id': newest.get('id'), 'date': newest.get('date')},
+        'length_words': quartiles(word_counts),
+        'headings_per_post': round(statistics.median(headings), 1),
+        'list_items_per_post': round(statistics.median(list_items), 1),
+        'images_per_post': round(statistics.median(images), 1),
+        'sentence_words': round(statistics.mean(sentence_lengths), 1) if sentence_lengths else 0,
+        'tone_per_1000_words': per_thousand,
+        'titles': {
+            'median_words': round(statistics.median(len(title.split()) for title in titles)) if titles else 0,
+            'with_colon': round(sum(':' in title for title in titles) / len(titles), 2) if titles else 0,
+            'with_question': round(sum('?' in title for title in titles) / len(titles), 2) if titles else 0,
+            'examples': titles[:5]
+        },
+        'common_phrases': common_phrases(texts),
+        'openings': [first_sentence(text) for text in texts[:3]],
+        'closings': [last_sentence(text) for text in texts[:3]]
+    }
+
+def style_profile_text(profile):
+    """Render a style profile as the compact prompt section that replaces raw examples"""
+    tone = profile['tone_per_1000_words']
+    low, median, high = profile['length_words']
+    lines = [
+        f"Style profile distilled from {profile['post_count']} published posts:",
+        f"- Length: usually {low}-{high} words (median {median})",
+        f"- Structure: about {profile['headings_per_post']} subheadings, {profile['list_items_per_post']} list items "
+        f"and {profile['images_per_post']} images per post",
+        f"- Sentences average {profile['sentence_words']} words",
+        f"- Voice per 1000 words: {tone.get('first_person', 0)} first-person words, "
+        f"{tone.get('second_person', 0)} addresses to the reader, {tone.get('contractions', 0)} contractions, "
+        f"{tone.get('questions', 0)} questions, {tone.get('exclamations', 0)} exclamations",
+        f"- Titles: about {profile['titles']['median_words']} words; "
+        f"{int(profile['titles']['with_colon'] * 100)}% use a colon, "
+        f"{int(profile['titles']['with_question'] * 100)}% are questions",
+    ]
+    if profile['titles']['examples']:
+        lines.append("- Recent titles: " + "; ".join(profile['titles']['examples']))
+    if profile['common_phrases']:
+        lines.append("- Recurring phrases: " + ", ".join(profile['common_phrases']))
+    if profile['openings']:
+        lines.append("- Typical openings:")
+        lines.extend(f'  "{opening}"' for opening in profile['openings'] if opening)
+    if profile['closings']:
+        lines.append("- Typical sign-offs:")
+        lines.extend(f'  "{closing}"' for closing in profile['closings'] if closing)
+    return "\n".join(lines)
+
+def _load_all(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def load_style_profile(site, path=STYLE_PROFILE_PATH):
+    """Return the stored style profile for a site, or None"""
+    profile = _load_all(path).get(site)
+    if not profile or profile.get('version') != PROFILE_VERSION:
+        return None
+    return profile
+
+def save_style_profile(site, profile, path=STYLE_PROFILE_PATH):
+    """Store the style profile for a site, keeping other sites' profiles"""
+    data = _load_all(path)
+    data[site] = profile
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Error saving style profile: {e}")
+
+async def refresh_style_profile(client, force=False, limit=STYLE_PROFILE_POSTS):
+    """Rebuild the stored profile for a site if a post was published since it was built"""
+    # The mirror only fetches what changed since its last sync (or, the first time, the newest posts)
+    api_base_url = client.api_base_url
+    mirror = get_post_mirror(api_base_url)
+    changed, new = await mirror.sync(client, initial_posts=limit)
+    print(f"Post mirror synced: {changed} changed posts, {new} of them new")
+    posts = mirror.recent_posts(limit)
+
+    current = load_style_profile(api_base_url)
+    if current and not force and posts:
+        if {'id': posts[0]['id'], 'date': posts[0]['date']} == current['newest_post']:
+            print(f"Style profile is up to date ({current['post_count']} posts)")
+            return current
+
+    profile = build_style_profile(posts)
+    if not profile:
+        print("No published posts with text to build a style profile from")
+        return current
+
+    save_style_profile(api_base_url, profile)
+    print(f"Built style profile from {profile['post_count']} posts "
+          f"(~{len(style_profile_text(profile)) // 4} prompt tokens)")
+    return profile
+
+def main():
+    """Build or show the style profile for the blog in blog-credentials.json"""
+    import argparse
+    from wp_client import AsyncWordPressClient, create_session
+
+    parser = argparse.ArgumentParser(description="Distill the blog archive into a reusable style profile")
+    parser.add_argument('command', choices=['build', 'show'], help="build (or refresh) the profile, or print it")
+    parser.add_argument('--credentials', default='blog-credentials.json', help="Path to the credentials file")
+    parser.add_argument('--posts', type=int, default=STYLE_PROFILE_POSTS, help="How many recent posts to distill")
+    parser.add_argument('--force', action='store_true', help="Rebuild even if no new posts were published")
+    args = parser.parse_args()
+
+    with open(args.credentials, 'r') as f:
+        credentials = json.load(f)
+
+    # Same site URL handling as the REST client
+    site_url = credentials.get('site_url') or credentials['xmlrpc_url'].replace('/xmlrpc.php', '')
+    api_base_url = f"{site_url.rstrip('/')}/wp-json/wp/v2"
+
+    if args.command == 'show':
+        profile = load_style_profile(api_base_url)
+        print(style_profile_text(profile) if profile else "No style profile yet, run: python style_profile.py build")
+        return
+
+    client = AsyncWordPressClient(create_session(credentials['username'], credentials['password']), api_base_url)
+    asyncio.run(refresh_style_profile(client, force=args.force, limit=args.posts))
+
+if __name__ == "__main__":
+    main()
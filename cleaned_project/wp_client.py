@@ -0,0 +1,119 @@
+"""
+WordPress Client
+----------------
+An asyncio front end to the WordPress REST API. Every request goes through one
+requests.Session with a bounded keep-alive connection pool (callers wait for a
+free connection instead of opening more) and a connect/read timeout. The
+operations are coroutines, so tag lookups, tag creation, collection reads
+and post creation can be gathered and run side by side; the blocking sends
+happen on a worker pool the size of the connection pool, so the client works
+from any event loop, including one started with asyncio.run() in a publish
+thread.
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+
+# Connections to the site that may be open at once, shared by every caller
+WP_MAX_CONNECTIONS = int(os.environ.get("WP_MAX_CONNECTIONS", "6"))
+WP_CONNECT_TIMEOUT = float(os.environ.get("WP_CONNECT_TIMEOUT", "10"))
+# Media uploads and big collection pages can take a while on shared hosting
+WP_READ_TIMEOUT = float(os.environ.get("WP_READ_TIMEOUT", "60"))
+# Pages of one collection fetched at once after the first (which tells us how many there are)
+WP_PAGE_CONCURRENCY = int(os.environ.get("WP_PAGE_CONCURRENCY", "4"))
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """Pooled adapter that applies our timeouts to requests that don't set their own"""
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = (WP_CONNECT_TIMEOUT, WP_READ_TIMEOUT)
+        return super().send(request, **kwargs)
+
+def create_session(username, password, max_connections=WP_MAX_CONNECTIONS):
+    """Return an authenticated session with a bounded keep-alive pool and default timeouts"""
+    session = requests.Session()
+    session.auth = HTTPBasicAuth(username, password)
+    # pool_block makes a caller wait for a free connection, so the pool size is a hard limit
+    adapter = TimeoutHTTPAdapter(pool_connections=1, pool_maxsize=max_connections, pool_block=True)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+class AsyncWordPressClient:
+    """WordPress REST operations as coroutines over a shared, bounded session"""
+
+    def __init__(self, session, api_base_url, max_connections=WP_MAX_CONNECTIONS):
+        self.session = session
+        self.api_base_url = api_base_url
+        self.max_connections = max_connections
+        self._executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="wp-request")
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def request(self, method, path, **kwargs):
+        """Send one request relative to the API base URL and return the response, raising on HTTP errors"""
+        response = await self._run(self.session.request, method, f"{self.api_base_url}/{path}", **kwargs)
+        response.raise_for_status()
+        return response
+
+    async def iter_collection(self, path, max_concurrency=WP_PAGE_CONCURRENCY, **params):
+        """Yield every item of a paginated collection in order, fetching the pages after the first concurrently"""
+        params.setdefault('per_page', 100)
+        response = await self.request('GET', path, params=dict(params, page=1))
+        items = response.json()
+        for item in items:
+            yield item
+
+        total_pages = response.headers.get('X-WP-TotalPages')
+        if total_pages is None:
+            # Some caching proxies strip the totals: fall back to reading page by page
+            page = 1
+            while len(items) >= params['per_page']:
+                page += 1
+                response = await self.request('GET', path, params=dict(params, page=page))
+                items = response.json()
+                for item in items:
+                    yield item
+            return
+
+        print(f"Reading {response.headers.get('X-WP-Total', '?')} items from {path} in {total_pages} pages")
+        limit = asyncio.Semaphore(max_concurrency)
+
+        async def fetch_page(page):
+            async with limit:
+                page_response = await self.request('GET', path, params=dict(params, page=page))
+                return page_response.json()
+
+        tasks = [asyncio.ensure_future(fetch_page(page)) for page in range(2, int(total_pages) + 1)]
+        try:
+            # Pages arrive in any order but are handed out in order, each as soon as it and its predecessors are in
+            for task in tasks:
+                for item in await task:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def get_tags(self, **params):
+        """Return one page of tags"""
+        response = await self.request('GET', 'tags', params=params)
+        return response.json()
+
+    async def create_tag(self, name):
+        """Create a tag and return it"""
+        response = await self.request('POST', 'tags', json={'name': name})
+        return response.json()
+
+    async def create_post(self, post_data):
+        """Create a post and return it"""
+        response = await self.request('POST', 'posts', json=post_data)
+        return response.json()
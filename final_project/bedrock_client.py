@@ -0,0 +1,88 @@
+"""
+Bedrock Client
+--------------
+One bedrock-runtime client per region for the whole process, with a
+connection pool big enough for our image workers, keep-alive, sane timeouts
+and adaptive retries. Building a client (and doing a fresh TLS handshake) on
+every call was a measurable chunk of each request's latency. Image calls get
+their own clients with a short read timeout and no botocore retries, so one
+attempt can't outlast the post's image time budget (retry_policy.py does the
+retrying for them).
+"""
+
+import math
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+from bedrock_metrics import instrument_client
+
+BEDROCK_CONNECT_TIMEOUT = float(os.environ.get("BEDROCK_CONNECT_TIMEOUT", "10"))
+# Claude can take a while to write 4000 tokens, so the read timeout is generous
+BEDROCK_READ_TIMEOUT = float(os.environ.get("BEDROCK_READ_TIMEOUT", "300"))
+# Retries botocore makes on its own after the first attempt; retry_policy.py adds
+# backoff and a circuit breaker on top for the image models
+BEDROCK_MAX_RETRIES = int(os.environ.get("BEDROCK_MAX_RETRIES", "2"))
+# A single image render takes seconds, not minutes; a longer wait means the call is stuck
+BEDROCK_IMAGE_READ_TIMEOUT = float(os.environ.get("BEDROCK_IMAGE_READ_TIMEOUT", "60"))
+
+# Every image and upload worker (same knobs as image_pipeline.py) plus the text
+# generation call can hold a connection at once
+IMAGE_CONCURRENCY = int(os.environ.get("IMAGE_CONCURRENCY", "3"))
+UPLOAD_CONCURRENCY = int(os.environ.get("UPLOAD_CONCURRENCY", "1"))
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.environ.get(
+    "BEDROCK_MAX_POOL_CONNECTIONS",
+    str(IMAGE_CONCURRENCY + UPLOAD_CONCURRENCY + 2)
+))
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def bedrock_config(read_timeout=BEDROCK_READ_TIMEOUT, max_retries=BEDROCK_MAX_RETRIES):
+    """Return the botocore config shared by every Bedrock call"""
+    return Config(
+        max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS,
+        connect_timeout=min(BEDROCK_CONNECT_TIMEOUT, read_timeout),
+        read_timeout=read_timeout,
+        tcp_keepalive=True,
+        retries={
+            'mode': 'adaptive',
+            'max_attempts': max_retries
+        }
+    )
+
+def get_bedrock_client(region_name):
+    """Return the process-wide bedrock-runtime client for a region"""
+    with _clients_lock:
+        if region_name not in _clients:
+            # boto3.client() on the default session isn't thread-safe, hence the lock;
+            # the client itself is safe to share between threads
+            _clients[region_name] = instrument_client(boto3.client(
+                service_name="bedrock-runtime",
+                region_name=region_name,
+                config=bedrock_config()
+            ))
+        return _clients[region_name]
+
+def get_bedrock_image_client(region_name, deadline=None):
+    """Return a bedrock-runtime client for one image call attempt that can't outlast deadline
+
+    Fetch it per attempt: the read timeout shrinks with deadline.remaining(),
+    rounded up to 10 s steps so a run only ever builds a handful of them.
+    """
+    read_timeout = BEDROCK_IMAGE_READ_TIMEOUT
+    if deadline is not None:
+        read_timeout = min(read_timeout, max(10, math.ceil(deadline.remaining() / 10) * 10))
+
+    key = (region_name, read_timeout)
+    with _clients_lock:
+        if key not in _clients:
+            # No botocore retries: call_with_retry decides whether another attempt fits the budget
+            _clients[key] = instrument_client(boto3.client(
+                service_name="bedrock-runtime",
+                region_name=region_name,
+                config=bedrock_config(read_timeout=read_timeout, max_retries=0)
+            ))
+        return _clients[key]
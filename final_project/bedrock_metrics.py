@@ -0,0 +1,230 @@
+"""
+Bedrock Metrics
+---------------
+Records every Bedrock model call as one JSON line: model ID, wall time, input
+and output tokens, bytes received, retries and outcome. Plain invoke_model
+calls are captured by botocore event hooks on the shared client, so no call
+site has to remember to do it; the streaming text call records itself. Each
+run ends with a per-model summary, and `python bedrock_metrics.py` summarizes
+the log across runs (e.g. the last hour).
+"""
+
+import atexit
+import json
+import os
+import statistics
+import threading
+import time
+
+CACHE_DIR = os.environ.get("AI_BUTLER_CACHE_DIR", os.path.expanduser("~/.cache/ai-butler"))
+
+# Set to an empty string to turn the call log off
+BEDROCK_METRICS_PATH = os.environ.get("BEDROCK_METRICS_PATH", os.path.join(CACHE_DIR, "bedrock-calls.jsonl"))
+
+# Ties the records (and the summary) of one process together
+RUN_ID = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def summarize(records):
+    """Aggregate call records per model"""
+    models = {}
+    for record in records:
+        stats = models.setdefault(record['model_id'], {
+            'calls': 0, 'failed': 0, 'seconds': [], 'input_tokens': 0, 'output_tokens': 0,
+            'cache_read_tokens': 0, 'cache_write_tokens': 0, 'bytes': 0, 'retries': 0
+        })
+        stats['calls'] += 1
+        if record['outcome'] != 'ok':
+            stats['failed'] += 1
+        stats['seconds'].append(record['seconds'])
+        stats['input_tokens'] += record.get('input_tokens') or 0
+        stats['output_tokens'] += record.get('output_tokens') or 0
+        stats['cache_read_tokens'] += record.get('cache_read_tokens') or 0
+        stats['cache_write_tokens'] += record.get('cache_write_tokens') or 0
+        stats['bytes'] += record.get('bytes') or 0
+        stats['retries'] += record.get('retries') or 0
+
+    for stats in models.values():
+        seconds = stats.pop('seconds')
+        stats['total_seconds'] = round(sum(seconds), 3)
+        stats['median_seconds'] = round(statistics.median(seconds), 3)
+        stats['max_seconds'] = round(max(seconds), 3)
+    return models
+
+def format_summary(models):
+    """Render summarize() output as one line per model, biggest time sink first"""
+    lines = []
+    for model_id, stats in sorted(models.items(), key=lambda item: -item[1]['total_seconds']):
+        lines.append(
+            f"  {model_id}: {stats['calls']} calls ({stats['failed']} failed, {stats['retries']} retries), "
+            f"{stats['total_seconds']:.1f}s total, median {stats['median_seconds']:.1f}s, "
+            f"max {stats['max_seconds']:.1f}s, {stats['input_tokens']} in / {stats['output_tokens']} out tokens, "
+            f"{stats['bytes'] / 1024:.0f} KB received"
+        )
+        if stats['cache_read_tokens'] or stats['cache_write_tokens']:
+            lines[-1] += f", prompt cache {stats['cache_read_tokens']} read / {stats['cache_write_tokens']} written tokens"
+    return "\n".join(lines)
+
+class CallLog:
+    """Appends call records to a JSONL file and keeps this run's records for the summary"""
+
+    def __init__(self, path=BEDROCK_METRICS_PATH):
+        self.path = path
+        self.records = []
+        self._lock = threading.Lock()
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            except OSError as e:
+                print(f"Error creating Bedrock metrics directory: {e}")
+                self.path = None
+
+    def record(self, record):
+        """Store one call record"""
+        line = json.dumps(record)
+        with self._lock:
+            self.records.append(record)
+            if not self.path:
+                return
+            try:
+                # One short write per line keeps concurrent processes from interleaving
+                with open(self.path, 'a') as f:
+                    f.write(line + "\n")
+            except OSError as e:
+                print(f"Error writing Bedrock metrics: {e}")
+
+    def write_summary(self):
+        """Print this run's per-model summary and append it to the log"""
+        with self._lock:
+            records = list(self.records)
+        if not records:
+            return
+        models = summarize(records)
+        print(f"Bedrock calls this run ({RUN_ID}):")
+        print(format_summary(models))
+        if self.path:
+            try:
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps({'type': 'summary', 'run_id': RUN_ID, 'ts': time.time(), 'models': models}) + "\n")
+            except OSError as e:
+                print(f"Error writing Bedrock metrics: {e}")
+
+_call_log = None
+_call_log_lock = threading.Lock()
+
+def get_call_log():
+    """Return the process-wide call log, summarized when the process exits"""
+    global _call_log
+    with _call_log_lock:
+        if _call_log is None:
+            _call_log = CallLog()
+            atexit.register(_call_log.write_summary)
+        return _call_log
+
+def record_call(model_id, operation, seconds, outcome, input_tokens=None, output_tokens=None,
+                bytes_received=None, retries=None, cache_read_tokens=None, cache_write_tokens=None):
+    """Record one Bedrock call"""
+    get_call_log().record({
+        'type': 'call',
+        'run_id': RUN_ID,
+        'ts': time.time(),
+        'model_id': model_id,
+        'operation': operation,
+        'seconds': round(seconds, 3),
+        'input_tokens': input_tokens,
+        'output_tokens': output_tokens,
+        'cache_read_tokens': cache_read_tokens,
+        'cache_write_tokens': cache_write_tokens,
+        'bytes': bytes_received,
+        'retries': retries,
+        'outcome': outcome
+    })
+
+def _start_call(params, context, **kwargs):
+    context['bedrock_metrics'] = {'model_id': params.get('modelId'), 'started': time.monotonic(), 'attempts': 0}
+
+def _count_attempt(request, **kwargs):
+    call = request.context.get('bedrock_metrics')
+    if call is not None:
+        call['attempts'] += 1
+
+def _finish_call(http_response, parsed, context, **kwargs):
+    call = context.get('bedrock_metrics')
+    if call is None:
+        return
+    headers = http_response.headers
+    error = parsed.get('Error', {}).get('Code') if http_response.status_code >= 300 else None
+    # Bedrock reports the token usage of every model in the response headers,
+    # so the body can stay unread for the caller
+    record_call(
+        call['model_id'],
+        'InvokeModel',
+        time.monotonic() - call['started'],
+        error or 'ok',
+        input_tokens=_as_int(headers.get('x-amzn-bedrock-input-token-count')),
+        output_tokens=_as_int(headers.get('x-amzn-bedrock-output-token-count')),
+        cache_read_tokens=_as_int(headers.get('x-amzn-bedrock-cache-read-input-token-count')),
+        cache_write_tokens=_as_int(headers.get('x-amzn-bedrock-cache-write-input-token-count')),
+        bytes_received=_as_int(headers.get('content-length')),
+        retries=max(0, call['attempts'] - 1)
+    )
+
+def _fail_call(exception, context, **kwargs):
+    call = context.get('bedrock_metrics')
+    if call is None:
+        return
+    record_call(
+        call['model_id'],
+        'InvokeModel',
+        time.monotonic() - call['started'],
+        type(exception).__name__,
+        retries=max(0, call['attempts'] - 1)
+    )
+
+def instrument_client(client):
+    """Record every invoke_model call made through a bedrock-runtime client"""
+    events = client.meta.events
+    events.register('before-parameter-build.bedrock-runtime.InvokeModel', _start_call)
+    events.register('before-send.bedrock-runtime.InvokeModel', _count_attempt)
+    events.register('after-call.bedrock-runtime.InvokeModel', _finish_call)
+    events.register('after-call-error.bedrock-runtime.InvokeModel', _fail_call)
+    return client
+
+def main():
+    """Summarize the Bedrock call log"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize recorded Bedrock calls per model")
+    parser.add_argument('--hours', type=float, default=None, help="Only include calls from the last N hours")
+    parser.add_argument('--path', default=BEDROCK_METRICS_PATH, help="Path to the JSONL call log")
+    args = parser.parse_args()
+
+    since = time.time() - args.hours * 3600 if args.hours else 0
+    records = []
+    try:
+        with open(args.path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('type') == 'call' and record['ts'] >= since:
+                    records.append(record)
+    except OSError as e:
+        print(f"Error reading Bedrock metrics: {e}")
+        return
+
+    if not records:
+        print("No Bedrock calls recorded")
+        return
+    runs = len({record['run_id'] for record in records})
+    print(f"{len(records)} Bedrock calls in {runs} runs:")
+    print(format_summary(summarize(records)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Fallback Images
+---------------
+What we show when Stable Diffusion lets us down. In "asset" mode a handful of
+generic placeholder images are rendered and uploaded once, then referenced by
+URL forever after (the media index remembers them between runs). In "render"
+mode each placeholder still gets its own caption, but the canvas and font are
+built once per process instead of on every failure.
+"""
+
+import functools
+import os
+import textwrap
+import threading
+import zlib
+
+from PIL import Image, ImageDraw, ImageFont
+
+from image_processing import prepare_image
+from media_upload import upload_media_rest
+
+# "asset" reuses pre-uploaded placeholders, "render" draws the description onto one
+FALLBACK_IMAGE_MODE = os.environ.get("FALLBACK_IMAGE_MODE", "asset").lower()
+
+FALLBACK_SIZE = (800, 450)
+FALLBACK_COLORS = [(73, 109, 137), (94, 84, 142), (52, 122, 110)]
+
+@functools.lru_cache(maxsize=None)
+def fallback_font():
+    """Load the placeholder font once per process"""
+    return ImageFont.load_default()
+
+@functools.lru_cache(maxsize=None)
+def fallback_canvas(color):
+    """Render the shared placeholder background for a color once per process"""
+    image = Image.new('RGB', FALLBACK_SIZE, color=color)
+    ImageDraw.Draw(image).text((10, 10), "AI Image Placeholder", fill=(255, 255, 255), font=fallback_font())
+    return image
+
+def fallback_color(description):
+    """Pick a placeholder color deterministically from the description"""
+    return FALLBACK_COLORS[zlib.crc32(description.encode('utf-8')) % len(FALLBACK_COLORS)]
+
+def render_fallback_image(description):
+    """Draw the description onto a copy of the cached placeholder canvas"""
+    image = fallback_canvas(fallback_color(description)).copy()
+    text = "\n".join(textwrap.wrap(description, width=90)[:10])
+    ImageDraw.Draw(image).text((10, 40), text, fill=(255, 255, 255), font=fallback_font())
+    return image
+
+_fallback_assets = {}
+_fallback_assets_lock = threading.Lock()
+
+def get_fallback_asset(wp_client, description):
+    """Return the URL of a pre-uploaded placeholder image, uploading it the first time"""
+    color = fallback_color(description)
+    with _fallback_assets_lock:
+        if color in _fallback_assets:
+            return _fallback_assets[color]
+
+        try:
+            # Identical bytes every time, so the media index turns this into a
+            # lookup on every run after the first
+            variant = prepare_image(fallback_canvas(color), widths=[])[0]
+            slot = FALLBACK_COLORS.index(color)
+            attachment = upload_media_rest(
+                wp_client,
+                variant['data'],
+                f"ai-image-placeholder-{slot}.{variant['extension']}",
+                variant['mime_type'],
+                alt_text="AI image placeholder"
+            )
+        except Exception as e:
+            print(f"Error preparing fallback image: {e}")
+            return None
+
+        _fallback_assets[color] = attachment['source_url']
+        return _fallback_assets[color]
@@ -13,25 +13,48 @@ This script:
 
 import os
 import json
+import asyncio
+import argparse
 import re
-import time
 import random
 import base64
 import io
 import sys
 import markdown
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Dict, Any, Tuple, Optional, Union
-import requests
-from requests.auth import HTTPBasicAuth
 from PIL import Image
-import boto3
+from bedrock_client import get_bedrock_client, get_bedrock_image_client
+from hedging import first_valid_response, invoke_claude_text
+from fallback_images import FALLBACK_IMAGE_MODE, get_fallback_asset, render_fallback_image
+from image_cache import get_image_cache, image_cache_key, seed_for_prompt
+from image_pipeline import IMAGE_CONCURRENCY, RenderPrefetcher, generate_then_upload, map_bounded
+from image_processing import prepare_image, srcset_attributes
+from llm_cache import add_llm_cache_arguments, configure_llm_cache, get_llm_cache
+from media_upload import upload_media_rest
+from placeholders import find_placeholders, replace_placeholders, unique_descriptions
+from post_metadata import SPLIT_METADATA, resolve_metadata, submit_metadata
+from post_mirror import get_post_mirror
+from post_stream import SECTION_MARKERS, SectionStreamParser, stream_claude_text
+from prompt_cache import check_prefix_stability, user_message
+from prompt_budget import format_style_examples
+from retry_policy import IMAGE_TIME_BUDGET, Deadline, RetryAborted, call_with_retry
+from structured_output import parse_json_output, parse_labeled_fields, split_sections
+from style_profile import load_style_profile, style_profile_text
+from tag_index import resolve_tags
+from wp_client import AsyncWordPressClient, create_session
 
 # Constants
 REGION = "us-west-2"  # AWS region where Bedrock is available
 MODEL_ID = "anthropic.claude-3-sonnet-20240229-v1:0"  # Using Claude 3 Sonnet model
 IMAGE_MODEL_ID = "stability.stable-diffusion-xl-v1"  # Using Stable Diffusion XL
 
+# How many posts a --count batch writes at the same time
+POST_CONCURRENCY = int(os.environ.get("POST_CONCURRENCY", "2"))
+
+# Stream Claude's response so image renders can start before the post is finished
+STREAM_TEXT_GENERATION = os.environ.get("STREAM_TEXT_GENERATION", "1") == "1"
+
 def get_wp_credentials():
     """Load WordPress credentials from JSON file"""
     try:
@@ -69,44 +92,37 @@ def create_wp_client(credentials):
     # Ensure site_url doesn't end with a slash
     site_url = site_url.rstrip('/')
     
-    # Create a session with authentication
-    session = requests.Session()
-    session.auth = HTTPBasicAuth(credentials['username'], credentials['password'])
+    # Create a session with authentication, a bounded keep-alive pool and timeouts
+    session = create_session(credentials['username'], credentials['password'])
     
     # Store the base URL for the WordPress REST API
     api_base_url = f"{site_url}/wp-json/wp/v2"
     
     return {
         'session': session,
-        'api_base_url': api_base_url
+        'api_base_url': api_base_url,
+        # Same session, as coroutines, for the steps that can run side by side
+        'async_client': AsyncWordPressClient(session, api_base_url)
     }
 
 def get_recent_posts(wp_client, num_posts=5):
-    """Fetch recent posts from WordPress via REST API"""
+    """Return recent posts from the local post mirror, syncing it with WordPress when it's stale"""
     try:
-        response = wp_client['session'].get(
-            f"{wp_client['api_base_url']}/posts",
-            params={
-                'per_page': num_posts,
-                'status': 'publish',
-                'orderby': 'date',
-                'order': 'desc',
-                '_embed': 1  # Include embedded info like author, featured media
-            }
-        )
-        response.raise_for_status()
-        posts = response.json()
+        # Within POST_MIRROR_MAX_AGE of the last sync this doesn't touch the network at all
+        mirror = get_post_mirror(wp_client['api_base_url'])
+        asyncio.run(mirror.sync_if_stale(wp_client['async_client']))
+        posts = mirror.recent_posts(num_posts)
         
         # Format posts for analysis
         formatted_posts = []
         for post in posts:
             # Extract content without HTML tags
-            content = re.sub(r'<[^>]+>', '', post['content']['rendered'])
+            content = re.sub(r'<[^>]+>', '', post['content'])
             
             formatted_post = {
-                'title': post['title']['rendered'],
+                'title': post['title'],
                 'content': content,
-                'excerpt': re.sub(r'<[^>]+>', '', post['excerpt']['rendered']),
+                'excerpt': re.sub(r'<[^>]+>', '', post['excerpt']),
                 'date': post['date'],
                 'link': post['link'],
                 'id': post['id']
@@ -123,100 +139,62 @@ def get_recent_posts(wp_client, num_posts=5):
         print(f"Error fetching recent posts: {e}")
         return []
 
-def get_all_tags(wp_client):
-    """Fetch all tags from WordPress"""
-    try:
-        all_tags = []
-        page = 1
-        per_page = 100
-        
-        while True:
-            response = wp_client['session'].get(
-                f"{wp_client['api_base_url']}/tags",
-                params={
-                    'per_page': per_page,
-                    'page': page
-                }
-            )
-            response.raise_for_status()
-            tags = response.json()
-            
-            if not tags:
-                break
-                
-            all_tags.extend(tags)
-            
-            # Check if we've reached the last page
-            if len(tags) < per_page:
-                break
-                
-            page += 1
-            
-        return all_tags
-    except Exception as e:
-        print(f"Error fetching tags: {e}")
-        return []
-
-def create_tag(wp_client, tag_name):
-    """Create a new tag in WordPress"""
-    try:
-        response = wp_client['session'].post(
-            f"{wp_client['api_base_url']}/tags",
-            json={
-                'name': tag_name
-            }
-        )
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        print(f"Error creating tag '{tag_name}': {e}")
-        return None
-
-def get_or_create_tags(wp_client, tag_names):
+async def get_or_create_tags(wp_client, tag_names):
     """Get or create tags by name and return their IDs"""
-    all_tags = get_all_tags(wp_client)
-    tag_map = {tag['name'].lower(): tag['id'] for tag in all_tags}
-    
-    tag_ids = []
-    for tag_name in tag_names:
-        tag_name_lower = tag_name.lower()
-        if tag_name_lower in tag_map:
-            tag_ids.append(tag_map[tag_name_lower])
-        else:
-            new_tag = create_tag(wp_client, tag_name)
-            if new_tag:
-                tag_ids.append(new_tag['id'])
-                
-    return tag_ids
+    # The local index answers most names; only unknown ones hit the site
+    return await resolve_tags(wp_client['async_client'], tag_names)
 
-def generate_post_with_claude(recent_posts):
+def generate_post_with_claude(recent_posts, on_placeholder=None, style_profile=None, topic=None):
     """Generate a new blog post using Claude 3 Sonnet in Markdown format"""
-    if not recent_posts:
+    if style_profile:
+        # The stored profile stands in for raw examples at a fraction of the tokens
+        style_intro = "Here is a profile of the writing style to emulate, distilled from the blog's archive:"
+        recent_posts_text = style_profile_text(style_profile)
+    elif not recent_posts:
         print("No recent posts found to analyze style")
         # Generate a post anyway with default style
+        style_intro = "Here are some recent blog posts that show the writing style to emulate:"
         recent_posts_text = "No recent posts available for style analysis."
     else:
-        # Format recent posts for Claude to analyze
-        recent_posts_text = "\n\n".join([
-            f"Title: {post['title']}\n\nContent: {post['content']}"
-            for post in recent_posts[:3]  # Use up to 3 recent posts
-        ])
-    
-    # Create Bedrock client
-    bedrock_runtime = boto3.client(
-        service_name="bedrock-runtime",
-        region_name=REGION
-    )
+        # Format up to 3 recent posts for Claude to analyze, sampled to fit the token budget
+        style_intro = "Here are some recent blog posts that show the writing style to emulate:"
+        recent_posts_text, _ = format_style_examples(recent_posts, max_posts=3)
     
-    # Current date for topical content
-    current_date = datetime.now().strftime("%B %d, %Y")
+    # Batch runs hand each post its own planned topic
+    if topic:
+        topic_instruction = f"Write about this topic: {topic}"
+    else:
+        topic_instruction = "Choose a topic that would be interesting to a tech-savvy audience interested in AI, software development, cloud computing, or digital innovation."
     
-    # Prepare the prompt for Claude
-    prompt = """You are a witty, insightful blog writer with a casual, conversational style and a touch of humor.
+    # In split mode the metadata comes from a cheaper model afterwards, so Claude 3
+    # Sonnet doesn't spend output tokens on it
+    if SPLIT_METADATA:
+        metadata_instruction = ""
+        metadata_format = ""
+        section_markers = SECTION_MARKERS[:2]
+    else:
+        metadata_instruction = """Also provide the following metadata separately:
+- Meta description for SEO (150-160 characters)
+- 3-5 relevant tags for the post
+- A brief excerpt (about 55 words)
 
-Today is """ + current_date + """.
+"""
+        metadata_format = """
+---META---
+Meta description: Your meta description here
+Tags: tag1, tag2, tag3
+Excerpt: Your excerpt here
+"""
+        section_markers = SECTION_MARKERS
+    
+    # Create Bedrock client
+    bedrock_runtime = get_bedrock_client(REGION)
+    
+    # Everything that stays the same from run to run goes first, so the prefix
+    # can be cached by Bedrock; the date and topic follow it
+    prefix = """You are a witty, insightful blog writer with a casual, conversational style and a touch of humor.
 
-Here are some recent blog posts that show the writing style to emulate:
+""" + style_intro + """
 
 """ + recent_posts_text + """
 
@@ -227,110 +205,159 @@ Please generate a new blog post in Markdown format that matches this style. The
 4. Include 2-3 places where images should be inserted, marked as ![Image: description](image-placeholder)
 5. Be 800-1200 words in length
 
-Also provide the following metadata separately:
-- Meta description for SEO (150-160 characters)
-- 3-5 relevant tags for the post
-- A brief excerpt (about 55 words)
-
-Choose a topic that would be interesting to a tech-savvy audience interested in AI, software development, cloud computing, or digital innovation.
-
-Format your response as:
+""" + metadata_instruction + """Format your response as:
 
 ---TITLE---
 # Your Title Here
 
 ---CONTENT---
 Your markdown content here with ![Image: description](image-placeholder) for images
+""" + metadata_format
+    check_prefix_stability('rest-post', prefix)
+    
+    # Current date for topical content
+    current_date = datetime.now().strftime("%B %d, %Y")
+    suffix = """
+Today is """ + current_date + """.
 
----META---
-Meta description: Your meta description here
-Tags: tag1, tag2, tag3
-Excerpt: Your excerpt here
-"""
+""" + topic_instruction
 
-    try:
+    request_body = {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": 4096,
+        "temperature": 0.7,
+        "messages": [
+            user_message(MODEL_ID, prefix, suffix)
+        ]
+    }
+    
+    # Only the first request prefetches images; a hedged backup's placeholders
+    # are rendered when the post is published
+    placeholder_callbacks = [on_placeholder]
+    
+    def fetch(should_stop):
+        if STREAM_TEXT_GENERATION:
+            # Sections are tracked as tokens arrive and each image placeholder is
+            # handed to on_placeholder the moment its closing bracket streams in
+            callback = placeholder_callbacks.pop() if placeholder_callbacks else None
+            parser = SectionStreamParser(on_placeholder=callback)
+            text = stream_claude_text(bedrock_runtime, MODEL_ID, request_body, parser.feed, should_stop)
+            print(f"Streamed post with {len(parser.placeholders)} image placeholders")
+            return text
         # Call Claude 3 Sonnet
-        response = bedrock_runtime.invoke_model(
-            modelId=MODEL_ID,
-            body=json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 4096,
-                "temperature": 0.7,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            })
-        )
-        
-        # Parse the response
-        response_body = json.loads(response.get('body').read())
-        content = response_body.get('content')[0].get('text')
-        
-        # Parse the response to extract the different sections
-        title_match = re.search(r'---TITLE---\s*(.*?)(?=---CONTENT---)', content, re.DOTALL)
-        content_match = re.search(r'---CONTENT---\s*(.*?)(?=---META---)', content, re.DOTALL)
-        meta_match = re.search(r'---META---\s*(.*)', content, re.DOTALL)
-        
-        if not title_match or not content_match or not meta_match:
+        return invoke_claude_text(bedrock_runtime, MODEL_ID, request_body, should_stop)
+    
+    def parse(text):
+        # Split the response into its sections in a single pass
+        sections = split_sections(text or "", section_markers)
+        if len(sections) < len(section_markers):
             print("Error parsing Claude's response - couldn't find all sections")
-            print(f"Raw response: {content}")
+            print(f"Raw response: {text}")
+            return None
+        return sections
+    
+    try:
+        # Reruns with a byte-identical prompt can reuse the last response; the
+        # image placeholders are then simply rendered when the post is published
+        llm_cache = get_llm_cache()
+        content = llm_cache.get(MODEL_ID, request_body)
+        if content is not None:
+            sections = parse(content)
+        else:
+            # With HEDGE_GENERATION=1 a slow or malformed response is backed up by a second request
+            content, sections = first_valid_response(fetch, parse, MODEL_ID, request_body)
+        if sections is None:
             return None
         
         # Extract and process the data
-        title = re.sub(r'^#\s+', '', title_match.group(1).strip())
-        markdown_content = content_match.group(1).strip()
+        title = re.sub(r'^#\s+', '', sections['---TITLE---'])
+        markdown_content = sections['---CONTENT---']
+        
+        # Only responses we could parse are worth replaying
+        llm_cache.put(MODEL_ID, request_body, content)
+        
+        if SPLIT_METADATA:
+            # Runs while the images render; publish_post_to_wordpress waits for it
+            return {
+                "title": title,
+                "content": markdown_content,
+                "metadata_future": submit_metadata(title, markdown_content, ('meta_description', 'tags', 'excerpt'), REGION)
+            }
         
         # Parse metadata
-        meta_text = meta_match.group(1).strip()
-        meta_description = re.search(r'Meta description:\s*(.*?)(?=\n|$)', meta_text)
-        tags = re.search(r'Tags:\s*(.*?)(?=\n|$)', meta_text)
-        excerpt = re.search(r'Excerpt:\s*(.*?)(?=\n|$)', meta_text)
+        meta = parse_labeled_fields(sections['---META---'], ['Meta description', 'Tags', 'Excerpt'])
         
         return {
             "title": title,
             "content": markdown_content,
-            "meta_description": meta_description.group(1).strip() if meta_description else "",
-            "tags": [tag.strip() for tag in tags.group(1).split(',')] if tags else [],
-            "excerpt": excerpt.group(1).strip() if excerpt else ""
+            "meta_description": meta['Meta description'],
+            "tags": [tag.strip() for tag in meta['Tags'].split(',') if tag.strip()],
+            "excerpt": meta['Excerpt']
         }
     except Exception as e:
         print(f"Error generating post with Claude: {e}")
         return None
 
-def extract_image_placeholders(markdown_content):
-    """Extract image placeholders from Markdown content"""
-    # Match multiple image placeholder formats:
-    # 1. ![Image: description](image-placeholder)
-    # 2. [IMAGE: description]
-    # 3. [image: description]
-    patterns = [
-        r'!\[Image:\s*(.*?)\]\(image-placeholder\)',  # Markdown format
-        r'\[IMAGE:\s*(.*?)\]',                        # [IMAGE: description] format
-        r'\[image:\s*(.*?)\]'                         # [image: description] format
-    ]
+def plan_topics(count, recent_titles=None):
+    """Ask Claude for count distinct post topics, or return None if that fails"""
+    avoid = ""
+    if recent_titles:
+        avoid = "\n\nAvoid repeating these recent posts:\n" + "\n".join(f"- {title}" for title in recent_titles)
     
-    descriptions = []
-    for pattern in patterns:
-        descriptions.extend(re.findall(pattern, markdown_content))
+    prompt = f"""You plan content for a witty, insightful tech blog read by a tech-savvy audience interested in AI, software development, cloud computing, or digital innovation.
+
+Today is {datetime.now().strftime("%B %d, %Y")}. Propose {count} distinct blog post topics, each covering a different subject, one sentence each.{avoid}
+
+Respond with only a JSON object of the form {{"topics": ["topic 1", "topic 2"]}}"""
+    
+    request_body = {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": 1024,
+        "temperature": 0.9,
+        "messages": [
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+    }
     
-    return descriptions
+    try:
+        response = get_bedrock_client(REGION).invoke_model(
+            modelId=MODEL_ID,
+            body=json.dumps(request_body)
+        )
+        response_body = json.loads(response.get('body').read())
+        plan = parse_json_output(response_body.get('content')[0].get('text'), required=('topics',))
+        # Drop blanks and repeats, the whole point is N different posts
+        topics = list(dict.fromkeys(str(topic).strip() for topic in (plan or {}).get('topics', []) if str(topic).strip()))
+        if len(topics) < count:
+            print(f"Claude planned only {len(topics)} of {count} topics")
+            return None
+        return topics[:count]
+    except Exception as e:
+        print(f"Error planning topics: {e}")
+        return None
 
-def generate_image(prompt):
+def extract_image_placeholders(markdown_content):
+    """Extract image placeholder descriptions from Markdown content"""
+    # One scan picks up ![Image: ...](image-placeholder), [IMAGE: ...], [Image: ...],
+    # [image: ...] and {{IMAGE: ...}}; repeated descriptions are only rendered once
+    return unique_descriptions(find_placeholders(markdown_content))
+
+def generate_image(prompt, deadline=None):
     """Generate an image using Stable Diffusion XL"""
-    bedrock_runtime = boto3.client(
-        service_name="bedrock-runtime",
-        region_name=REGION
-    )
-    
     # Keep prompt very short but descriptive
     words = prompt.split()
     short_prompt = " ".join(words[:10]) if len(words) > 10 else prompt
     enhanced_prompt = f"Blog illustration: {short_prompt}"
     
-    try:
+    # Stable seed per prompt, so reruns of the same post hit the image cache
+    seed = seed_for_prompt(IMAGE_MODEL_ID, enhanced_prompt)
+    cache_key = image_cache_key(IMAGE_MODEL_ID, enhanced_prompt, 512, 512, 8.0, 50, seed)
+    
+    def render():
+        bedrock_runtime = get_bedrock_image_client(REGION, deadline)
         print(f"Generating image with Stable Diffusion XL: '{enhanced_prompt}'")
         response = bedrock_runtime.invoke_model(
             modelId=IMAGE_MODEL_ID,
@@ -345,7 +372,7 @@ def generate_image(prompt):
                 ],
                 "cfg_scale": 8.0,
                 "steps": 50,
-                "seed": random.randint(0, 4294967295),
+                "seed": seed,
                 "width": 512,
                 "height": 512
             })
@@ -356,121 +383,141 @@ def generate_image(prompt):
         
         # Get the base64 encoded image
         base64_image = response_body.get('artifacts')[0].get('base64')
+        return base64.b64decode(base64_image)
+    
+    try:
+        # Fresh renders go through the shared retry policy (backoff, circuit breaker, time budget)
+        image_data = get_image_cache().get_or_render(
+            cache_key,
+            lambda: call_with_retry(render, IMAGE_MODEL_ID, deadline)
+        )
         
         # Convert base64 to image
-        image_data = base64.b64decode(base64_image)
         image = Image.open(io.BytesIO(image_data))
         
         return image
-            
+    
+    except RetryAborted as e:
+        # Out of time or the model is down for this run: go straight to the fallback text
+        print(f"Skipping image generation: {e}")
+        return None
     except Exception as e:
         print(f"Error generating image with Stable Diffusion XL: {e}")
         # For debugging purposes, print more details about the error
         import traceback
         traceback.print_exc()
         
-        # Fallback to a placeholder image
+        # In asset mode the caller points at a pre-uploaded placeholder instead
+        if FALLBACK_IMAGE_MODE != 'render':
+            return None
+        
+        # Fallback to a placeholder image drawn on the cached canvas
         print("Using placeholder image instead")
         try:
-            # Create a simple colored placeholder with text
-            img = Image.new('RGB', (800, 450), color=(73, 109, 137))
-            from PIL import ImageDraw
-            d = ImageDraw.Draw(img)
-            d.text((10,10), f"AI Image Placeholder\n\n{prompt}", fill=(255,255,255))
-            return img
-        except:
+            return render_fallback_image(prompt)
+        except Exception:
             return None
 
 def upload_image_to_wordpress(wp_client, image, filename, alt_text):
     """Upload an image to WordPress via REST API"""
     try:
-        # Save image to a temporary file
-        temp_file = f"temp_{filename}.jpg"
-        image.save(temp_file, "JPEG")
+        # Transcode in memory (and build any responsive variants) instead of going through a temporary file
+        variants = prepare_image(image)
         
-        # Upload the image
-        with open(temp_file, 'rb') as img:
-            files = {'file': (f"{filename}.jpg", img, 'image/jpeg')}
-            response = wp_client['session'].post(
-                f"{wp_client['api_base_url']}/media",
-                files=files,
-                data={'alt_text': alt_text}
+        # Upload the full-size image first, then the narrower variants
+        uploaded = None
+        sources = []
+        for variant in variants:
+            suffix = f"-{variant['width']}w" if uploaded else ""
+            attachment = upload_media_rest(
+                wp_client,
+                variant['data'],
+                f"{filename}{suffix}.{variant['extension']}",
+                variant['mime_type'],
+                alt_text=alt_text
             )
+            if uploaded is None:
+                uploaded = attachment
+            sources.append((attachment['source_url'], variant['width']))
         
-        # Clean up the temporary file
-        os.remove(temp_file)
-        
-        response.raise_for_status()
-        return response.json()
+        # Remember every rendition so the figure can offer a srcset
+        uploaded['sources'] = sources
+        return uploaded
     except Exception as e:
         print(f"Error uploading image: {e}")
-        if os.path.exists(f"temp_{filename}.jpg"):
-            os.remove(f"temp_{filename}.jpg")
         return None
 
-def replace_image_placeholders(wp_client, markdown_content, image_descriptions):
+def upload_placeholder_image(wp_client, description, image):
+    """Upload a finished render and return the markup that replaces its placeholder"""
+    if not image:
+        print(f"  Failed to generate image for: {description}")
+        # Reference a pre-uploaded placeholder: no render, no upload
+        fallback_url = get_fallback_asset(wp_client, description) if FALLBACK_IMAGE_MODE == 'asset' else None
+        if fallback_url:
+            image_md = '<figure class="wp-block-image size-large">\n'
+            image_md += f'<img src="{fallback_url}" alt="{description}" />\n'
+            image_md += f'<figcaption>{description}</figcaption>\n'
+            image_md += '</figure>'
+            return image_md
+        
+        # If generation failed, replace with a message
+        fallback_messages = [
+            f'*AI tried to draw "{description}" but apparently needs more coffee.*',
+            f'*Image generation failed for: "{description}". The AI is taking an artistic break.*',
+            f'*Our AI artist was feeling uninspired when trying to create: "{description}"*'
+        ]
+        return random.choice(fallback_messages)
+    
+    # Upload image to WordPress
+    sanitized_desc = re.sub(r'[^a-zA-Z0-9]', '-', description)[:40]
+    filename = f"ai-image-{sanitized_desc}"
+    print(f"  Uploading image to WordPress as {filename}")
+    uploaded = upload_image_to_wordpress(wp_client, image, filename, description)
+    
+    if not uploaded:
+        print("  Failed to upload image")
+        # If upload failed, replace with a message
+        return f'*Image generation failed for: {description}*'
+    
+    print(f"  Image uploaded successfully: {uploaded['source_url']}")
+    # Create Markdown for the image with figure and caption
+    image_md = '<figure class="wp-block-image size-large">\n'
+    image_md += f'<img src="{uploaded["source_url"]}"{srcset_attributes(uploaded.get("sources", []))} alt="{description}" />\n'
+    image_md += f'<figcaption>{description}</figcaption>\n'
+    image_md += '</figure>'
+    return image_md
+
+def replace_image_placeholders(wp_client, markdown_content, image_descriptions, prefetcher=None):
     """Replace image placeholders with actual WordPress images"""
-    updated_content = markdown_content
+    # Render every image at once and upload each one while the rest are still rendering.
+    # Once the time budget for this post runs out, remaining images fall back to text.
+    print(f"Processing {len(image_descriptions)} images with up to {IMAGE_CONCURRENCY} concurrent workers")
+    if prefetcher:
+        # Most renders were already started while Claude was still streaming the post
+        generate = prefetcher.get
+    else:
+        deadline = Deadline()
+        generate = lambda description: generate_image(description, deadline)
+    replacements = generate_then_upload(
+        image_descriptions,
+        generate,
+        lambda description, image: upload_placeholder_image(wp_client, description, image)
+    )
+    replacement_for = dict(zip(image_descriptions, replacements))
     
-    # Define all the placeholder patterns we need to replace
-    placeholder_patterns = [
-        lambda desc: f'![Image: {desc}](image-placeholder)',
-        lambda desc: f'[IMAGE: {desc}]',
-        lambda desc: f'[image: {desc}]'
+    # Swap every placeholder for its image in a single pass once all uploads have resolved
+    placeholders = [
+        placeholder for placeholder in find_placeholders(markdown_content)
+        if placeholder['description'] in replacement_for
     ]
+    updated_content = replace_placeholders(
+        markdown_content,
+        placeholders,
+        [replacement_for[placeholder['description']] for placeholder in placeholders]
+    )
     
-    for i, description in enumerate(image_descriptions):
-        print(f"Processing image {i+1}/{len(image_descriptions)}: {description}")
-        
-        # Try to generate image up to 2 times
-        image = None
-        for attempt in range(2):
-            print(f"  Attempt {attempt+1}/2 to generate image")
-            image = generate_image(description)
-            if image:
-                print("  Image generated successfully")
-                break
-            print(f"  Retrying image generation for: {description}")
-            time.sleep(1)
-        
-        if image:
-            # Upload image to WordPress
-            sanitized_desc = re.sub(r'[^a-zA-Z0-9]', '-', description)[:40]
-            filename = f"ai-image-{sanitized_desc}"
-            print(f"  Uploading image to WordPress as {filename}")
-            uploaded = upload_image_to_wordpress(wp_client, image, filename, description)
-            
-            if uploaded:
-                print(f"  Image uploaded successfully: {uploaded['source_url']}")
-                # Create Markdown for the image with figure and caption
-                image_md = f'<figure class="wp-block-image size-large">\n'
-                image_md += f'<img src="{uploaded["source_url"]}" alt="{description}" />\n'
-                image_md += f'<figcaption>{description}</figcaption>\n'
-                image_md += '</figure>'
-                
-                # Replace all possible placeholder formats with the image HTML
-                for pattern_func in placeholder_patterns:
-                    placeholder = pattern_func(description)
-                    updated_content = updated_content.replace(placeholder, image_md)
-            else:
-                print("  Failed to upload image")
-                # If upload failed, replace with a message
-                fallback_msg = f'*Image generation failed for: {description}*'
-                for pattern_func in placeholder_patterns:
-                    placeholder = pattern_func(description)
-                    updated_content = updated_content.replace(placeholder, fallback_msg)
-        else:
-            print("  Failed to generate image")
-            # If generation failed, replace with a message
-            fallback_messages = [
-                f'*AI tried to draw "{description}" but apparently needs more coffee.*',
-                f'*Image generation failed for: "{description}". The AI is taking an artistic break.*',
-                f'*Our AI artist was feeling uninspired when trying to create: "{description}"*'
-            ]
-            fallback = random.choice(fallback_messages)
-            for pattern_func in placeholder_patterns:
-                placeholder = pattern_func(description)
-                updated_content = updated_content.replace(placeholder, fallback)
+    cache_stats = get_image_cache().stats()
+    print(f"Image cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
     
     return updated_content
 
@@ -493,47 +540,94 @@ def markdown_to_html(markdown_content):
         # Return the original markdown as a fallback
         return f"<pre>{markdown_content}</pre>"
 
-def publish_post_to_wordpress(wp_client, post_data):
+async def publish_post_async(wp_client, post_data, prefetcher=None, status='publish', date_gmt=None):
+    """Upload the images, resolve the tags and create the post, overlapping what doesn't depend on each other"""
+    # Extract image placeholders and replace them with actual images on the threaded pipeline
+    image_descriptions = extract_image_placeholders(post_data['content'])
+    images = asyncio.create_task(asyncio.to_thread(
+        replace_image_placeholders, wp_client, post_data['content'], image_descriptions, prefetcher
+    ))
+    
+    # In split mode the metadata model has been working while the images rendered
+    await asyncio.to_thread(resolve_metadata, post_data)
+    
+    # Get or create tags while the images upload
+    tag_ids = await get_or_create_tags(wp_client, post_data['tags'])
+    content_with_images = await images
+    
+    # Convert Markdown to HTML
+    html_content = markdown_to_html(content_with_images)
+    
+    # Prepare the post data
+    wp_post_data = {
+        'title': post_data['title'],
+        'content': html_content,
+        'excerpt': post_data['excerpt'],
+        'status': status,
+        'tags': tag_ids,
+        'meta': {
+            'description': post_data['meta_description']
+        }
+    }
+    if date_gmt:
+        # Scheduled ("future") posts go live at this UTC time
+        wp_post_data['date_gmt'] = date_gmt.strftime('%Y-%m-%dT%H:%M:%S')
+    
+    # Create the post
+    published_post = await wp_client['async_client'].create_post(wp_post_data)
+    print(f"Post saved as {published_post.get('status', status)}: {published_post['link']}")
+    return published_post
+
+def publish_post_to_wordpress(wp_client, post_data, prefetcher=None, status='publish', date_gmt=None):
     """Publish the generated post to WordPress via REST API"""
     try:
-        # Get or create tags
-        tag_ids = get_or_create_tags(wp_client, post_data['tags'])
-        
-        # Extract image placeholders and replace them with actual images
-        image_descriptions = extract_image_placeholders(post_data['content'])
-        content_with_images = replace_image_placeholders(wp_client, post_data['content'], image_descriptions)
-        
-        # Convert Markdown to HTML
-        html_content = markdown_to_html(content_with_images)
-        
-        # Prepare the post data
-        wp_post_data = {
-            'title': post_data['title'],
-            'content': html_content,
-            'excerpt': post_data['excerpt'],
-            'status': 'publish',
-            'tags': tag_ids,
-            'meta': {
-                'description': post_data['meta_description']
-            }
-        }
-        
-        # Create the post
-        response = wp_client['session'].post(
-            f"{wp_client['api_base_url']}/posts",
-            json=wp_post_data
-        )
-        response.raise_for_status()
-        
-        published_post = response.json()
-        print(f"Post published successfully: {published_post['link']}")
-        return published_post
+        return asyncio.run(publish_post_async(wp_client, post_data, prefetcher, status=status, date_gmt=date_gmt))
     except Exception as e:
         print(f"Error publishing post: {e}")
         return None
 
+def generate_and_publish(wp_client, recent_posts, style_profile, prefetcher, topic=None, status='publish', date_gmt=None):
+    """Generate one post, rendering its images on the shared prefetcher, and save it to WordPress"""
+    def on_placeholder(description):
+        print(f"  Placeholder streamed in, starting render: {description}")
+        prefetcher.prefetch(description)
+    
+    # Generate new post with Claude
+    print(f"Generating new post with Claude 3 Sonnet{f' about: {topic}' if topic else ''}...")
+    post_data = generate_post_with_claude(
+        recent_posts,
+        on_placeholder=on_placeholder,
+        style_profile=style_profile,
+        topic=topic
+    )
+    if not post_data:
+        print("Failed to generate post")
+        return None
+    
+    print(f"Generated post: {post_data['title']}")
+    
+    # Publish post to WordPress
+    print("Publishing post to WordPress...")
+    return publish_post_to_wordpress(wp_client, post_data, prefetcher, status=status, date_gmt=date_gmt)
+
 def main():
     """Main function to generate and publish a post"""
+    parser = argparse.ArgumentParser(description="Generate a Markdown post in the style of recent posts and publish it via the REST API")
+    parser.add_argument('--count', type=int, default=1, help="Generate this many posts on distinct topics in one run")
+    parser.add_argument('--status', choices=['publish', 'draft', 'pending', 'future'],
+                        help="Post status (default: publish for one post, draft for a batch; future needs --schedule-every)")
+    parser.add_argument('--schedule-every', type=float, metavar='HOURS',
+                        help="Schedule the posts HOURS apart, starting HOURS from now (implies --status future)")
+    add_llm_cache_arguments(parser)
+    args = parser.parse_args()
+    # Without a date WordPress publishes a 'future' post right away
+    if args.status == 'future' and not args.schedule_every:
+        parser.error("--status future needs --schedule-every")
+    configure_llm_cache(args)
+
+    count = max(1, args.count)
+    status = args.status or ('future' if args.schedule_every else 'draft' if count > 1 else 'publish')
+    
     # Load WordPress credentials
     credentials = get_wp_credentials()
     if not credentials:
@@ -546,31 +640,65 @@ def main():
         print("Failed to create WordPress client")
         return
     
-    # Fetch recent posts
-    print("Fetching recent posts...")
-    recent_posts = get_recent_posts(wp_client)
-    if not recent_posts:
-        print("No recent posts found")
+    # A stored style profile makes fetching recent posts unnecessary
+    style_profile = load_style_profile(wp_client['api_base_url'])
+    if style_profile:
+        print(f"Using style profile built from {style_profile['post_count']} posts")
+        recent_posts = []
     else:
-        print(f"Found {len(recent_posts)} recent posts")
+        # Fetch recent posts
+        print("Fetching recent posts (run 'python style_profile.py build' to skip this)...")
+        recent_posts = get_recent_posts(wp_client)
+        if not recent_posts:
+            print("No recent posts found")
+        else:
+            print(f"Found {len(recent_posts)} recent posts")
     
-    # Generate new post with Claude
-    print("Generating new post with Claude 3 Sonnet...")
-    post_data = generate_post_with_claude(recent_posts)
-    if not post_data:
-        print("Failed to generate post")
-        return
+    # One topic per post, so a batch doesn't come back as N takes on the same idea
+    topics = [None]
+    if count > 1:
+        # Titles come from the synced mirror, not the style profile, so posts published
+        # since the profile was built are avoided too
+        recent_titles = [post['title'] for post in recent_posts or get_recent_posts(wp_client)]
+        if not recent_titles and style_profile:
+            recent_titles = style_profile['titles']['examples']
+        topics = plan_topics(count, recent_titles)
+        if not topics:
+            print("Failed to plan distinct topics")
+            return
+        for i, topic in enumerate(topics, 1):
+            print(f"  Topic {i}: {topic}")
     
-    print(f"Generated post: {post_data['title']}")
+    # Scheduled posts are spread out from now on, one interval apart
+    dates = [None] * count
+    if args.schedule_every:
+        now = datetime.utcnow()
+        dates = [now + timedelta(hours=args.schedule_every * (i + 1)) for i in range(count)]
     
-    # Publish post to WordPress
-    print("Publishing post to WordPress...")
-    published_post = publish_post_to_wordpress(wp_client, post_data)
-    if published_post:
-        print("Post published successfully!")
-        print(f"URL: {published_post['link']}")
+    # Images start rendering as soon as their placeholders stream in, so the time
+    # budget starts now too. Every post in the batch renders on this one pool.
+    deadline = Deadline(IMAGE_TIME_BUDGET * count)
+    prefetcher = RenderPrefetcher(lambda description: generate_image(description, deadline))
+    
+    try:
+        results = map_bounded(
+            lambda job: generate_and_publish(
+                wp_client, recent_posts, style_profile, prefetcher,
+                topic=job[0], status=status, date_gmt=job[1]
+            ),
+            list(zip(topics, dates)),
+            max_workers=POST_CONCURRENCY
+        )
+    finally:
+        prefetcher.shutdown()
+    
+    saved = [post for post in results if post]
+    for post in saved:
+        print(f"URL: {post['link']}")
+    if len(saved) == count:
+        print("Post published successfully!" if count == 1 and status == 'publish' else f"{count} posts saved as {status}")
     else:
-        print("Failed to publish post")
+        print(f"Failed to publish {count - len(saved)} of {count} posts")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,268 @@
+"""
+Hedging
+-------
+Hedged text generation: if Claude hasn't answered by the time most past calls
+had (a percentile of the recorded latencies), a second identical request is
+started, and whichever response passes validation first wins. A response that
+fails validation triggers the backup straight away instead of killing the run.
+Backup requests are paid for out of a per-run token budget. Hedged requests
+stream, so the loser stops reading (and paying for) tokens as soon as the
+other one wins, and they run on daemon threads the process never waits for.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+from bedrock_metrics import record_call
+from prompt_budget import estimate_tokens
+
+# Off by default: every hedge is a second full generation we might pay for
+HEDGE_GENERATION = os.environ.get("HEDGE_GENERATION", "0") == "1"
+# Start the backup once the call is slower than this share of past calls
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", "90"))
+# Delay used until enough latencies have been recorded
+HEDGE_DEFAULT_DELAY = float(os.environ.get("HEDGE_DEFAULT_DELAY", "45"))
+HEDGE_MIN_SAMPLES = 5
+# Estimated input + output tokens all backup requests in one run may spend
+HEDGE_TOKEN_BUDGET = int(os.environ.get("HEDGE_TOKEN_BUDGET", "20000"))
+
+CACHE_DIR = os.environ.get("AI_BUTLER_CACHE_DIR", os.path.expanduser("~/.cache/ai-butler"))
+
+LATENCY_HISTORY_PATH = os.environ.get("LATENCY_HISTORY_PATH", os.path.join(CACHE_DIR, "latency.json"))
+LATENCY_HISTORY_SIZE = 50
+
+class LatencyHistory:
+    """Recent successful call latencies per model, persisted between runs"""
+
+    def __init__(self, path=LATENCY_HISTORY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r') as f:
+                self._samples = json.load(f)
+        except (OSError, ValueError):
+            self._samples = {}
+
+    def record(self, model_id, seconds):
+        """Remember how long a successful call took"""
+        with self._lock:
+            samples = self._samples.setdefault(model_id, [])
+            samples.append(round(seconds, 3))
+            del samples[:-LATENCY_HISTORY_SIZE]
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(self._samples, f)
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                print(f"Error saving latency history: {e}")
+
+    def percentile(self, model_id, pct, default):
+        """Return the pct-th percentile latency for a model, or default without enough samples"""
+        with self._lock:
+            samples = sorted(self._samples.get(model_id, []))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return default
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+class HedgeBudget:
+    """Tokens the backup requests of this run may still spend"""
+
+    def __init__(self, tokens=HEDGE_TOKEN_BUDGET):
+        self.remaining = tokens
+        self.hedges = 0
+        self.wins = 0
+        self._lock = threading.Lock()
+
+    def try_spend(self, tokens):
+        """Reserve tokens for one backup request, or return False if that would exceed the budget"""
+        with self._lock:
+            if tokens > self.remaining:
+                return False
+            self.remaining -= tokens
+            self.hedges += 1
+            return True
+
+    def record_win(self):
+        """Count a run where the backup request won"""
+        with self._lock:
+            self.wins += 1
+
+_history = None
+_budget = None
+_singletons_lock = threading.Lock()
+
+def get_latency_history():
+    """Return the process-wide latency history"""
+    global _history
+    with _singletons_lock:
+        if _history is None:
+            _history = LatencyHistory()
+        return _history
+
+def get_hedge_budget():
+    """Return the hedge budget for this run"""
+    global _budget
+    with _singletons_lock:
+        if _budget is None:
+            _budget = HedgeBudget()
+        return _budget
+
+def stream_claude_text(bedrock_runtime, model_id, request_body, on_text, should_stop=None):
+    """Invoke a Claude model with response streaming, passing each text delta to on_text"""
+    started = time.monotonic()
+    try:
+        response = bedrock_runtime.invoke_model_with_response_stream(
+            modelId=model_id,
+            body=json.dumps(request_body)
+        )
+    except Exception as e:
+        record_call(model_id, 'InvokeModelWithResponseStream', time.monotonic() - started, type(e).__name__)
+        raise
+
+    text_parts = []
+    usage = {}
+    bytes_received = 0
+    outcome = 'ok'
+    try:
+        for event in response['body']:
+            # A hedged request that already lost stops reading (and paying for) tokens
+            if should_stop and should_stop():
+                response['body'].close()
+                outcome = 'cancelled'
+                break
+            chunk = event.get('chunk')
+            if not chunk:
+                continue
+            bytes_received += len(chunk['bytes'])
+            data = json.loads(chunk['bytes'])
+            if data.get('type') == 'content_block_delta' and data['delta'].get('type') == 'text_delta':
+                text = data['delta']['text']
+                text_parts.append(text)
+                on_text(text)
+            elif data.get('type') == 'message_start':
+                usage.update(data['message'].get('usage', {}))
+            elif data.get('type') == 'message_delta':
+                usage.update(data.get('usage', {}))
+    except Exception as e:
+        outcome = type(e).__name__
+        raise
+    finally:
+        record_call(
+            model_id,
+            'InvokeModelWithResponseStream',
+            time.monotonic() - started,
+            outcome,
+            input_tokens=usage.get('input_tokens'),
+            output_tokens=usage.get('output_tokens'),
+            cache_read_tokens=usage.get('cache_read_input_tokens'),
+            cache_write_tokens=usage.get('cache_creation_input_tokens'),
+            bytes_received=bytes_received,
+            retries=response['ResponseMetadata'].get('RetryAttempts')
+        )
+
+    return "".join(text_parts)
+
+def invoke_claude_text(bedrock_runtime, model_id, request_body, should_stop=None):
+    """Call a Claude model once and return the text of its response
+
+    With should_stop the response is streamed, and reading stops (returning
+    the partial text) as soon as should_stop() is true.
+    """
+    if should_stop is not None:
+        return stream_claude_text(bedrock_runtime, model_id, request_body, lambda text: None, should_stop)
+    response = bedrock_runtime.invoke_model(
+        modelId=model_id,
+        body=json.dumps(request_body)
+    )
+    response_body = json.loads(response['body'].read())
+    return response_body['content'][0]['text']
+
+def first_valid_response(call, validate, model_id, request_body, hedge=None):
+    """Run call(should_stop) and return (text, validate(text)), hedging with a backup if enabled
+
+    call gets a should_stop() function it may poll to abandon a request that
+    has already lost. validate returns the parsed result, or None to reject
+    the text. When nothing passes, the result is (last text, None).
+    """
+    if hedge is None:
+        hedge = HEDGE_GENERATION
+    history = get_latency_history()
+
+    def attempt(stop_event):
+        started = time.monotonic()
+        text = call(stop_event.is_set)
+        if stop_event.is_set():
+            return text, None
+        parsed = validate(text)
+        if parsed is not None:
+            history.record(model_id, time.monotonic() - started)
+        return text, parsed
+
+    if not hedge:
+        return attempt(threading.Event())
+
+    budget = get_hedge_budget()
+    hedge_cost = estimate_tokens(json.dumps(request_body.get('messages', []))) + request_body.get('max_tokens', 0)
+    delay = history.percentile(model_id, HEDGE_PERCENTILE, HEDGE_DEFAULT_DELAY)
+
+    stop_event = threading.Event()
+
+    def submit():
+        # A daemon thread rather than a pool worker: a pool is joined at exit,
+        # which would keep the process alive until the losing request finished
+        future = Future()
+
+        def run():
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(attempt(stop_event))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name="hedge-worker", daemon=True).start()
+        return future
+
+    futures = {submit(): 'primary'}
+    hedged = False
+    last_text = None
+
+    try:
+        timeout = delay
+        while futures:
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                label = futures.pop(future)
+                try:
+                    text, parsed = future.result()
+                except Exception as e:
+                    print(f"{label.capitalize()} request to {model_id} failed: {e}")
+                    continue
+                last_text = text
+                if parsed is not None:
+                    if label == 'backup':
+                        budget.record_win()
+                    print(f"{label.capitalize()} request to {model_id} won")
+                    return text, parsed
+                print(f"{label.capitalize()} response from {model_id} failed validation")
+
+            # Slow (nothing done before the deadline) or bad (done but rejected): back it up once
+            if not hedged and (not done or not futures):
+                hedged = True
+                if budget.try_spend(hedge_cost):
+                    reason = "failed" if done else f"slower than p{HEDGE_PERCENTILE:g} ({delay:.1f}s)"
+                    print(f"Request to {model_id} {reason}, starting a backup request")
+                    futures[submit()] = 'backup'
+                else:
+                    print(f"Hedge budget exhausted, not backing up the request to {model_id}")
+            timeout = None
+        return last_text, None
+    finally:
+        # The loser may still be streaming; tell it to stop and don't wait for it
+        stop_event.set()
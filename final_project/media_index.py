@@ -0,0 +1,155 @@
+"""
+Media Index
+-----------
+A local map from image content hash to the WordPress attachment that already
+holds those bytes, so a rerun never uploads the same image twice. The hash is
+also baked into uploaded filenames, which lets the index rebuild itself from
+the /wp/v2/media listing.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+
+CACHE_DIR = os.environ.get("AI_BUTLER_CACHE_DIR", os.path.expanduser("~/.cache/ai-butler"))
+
+MEDIA_INDEX_PATH = os.environ.get("MEDIA_INDEX_PATH", os.path.join(CACHE_DIR, "media-index.json"))
+
+# Uploaded filenames end in -<hash>, optionally followed by WordPress' own -1, -scaled, -300x300...
+HASH_IN_FILENAME = re.compile(r'-([0-9a-f]{16})(?=[-.]|$)')
+
+def content_hash(data):
+    """Return the short content hash we use to identify an image"""
+    return hashlib.sha256(data).hexdigest()[:16]
+
+def hashed_filename(filename, digest):
+    """Append the content hash to a filename, keeping its extension"""
+    name, extension = os.path.splitext(filename)
+    return f"{name}-{digest}{extension}"
+
+class MediaIndex:
+    """Content hash to attachment index for one WordPress site, persisted as JSON"""
+
+    def __init__(self, site, path=MEDIA_INDEX_PATH):
+        self.site = site
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = self._load().get(site, {})
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        # Merge with whatever is on disk so other sites' entries survive
+        data = self._load()
+        data[self.site] = self._entries
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Error saving media index: {e}")
+
+    def get(self, digest):
+        """Return the known attachment for a content hash, or None"""
+        with self._lock:
+            return self._entries.get(digest)
+
+    def add(self, digest, attachment_id, url):
+        """Remember that an attachment holds the bytes with this hash"""
+        with self._lock:
+            self._entries[digest] = {'id': attachment_id, 'url': url}
+            self._save()
+
+    def remove(self, digest):
+        """Forget an attachment that no longer exists on the site"""
+        with self._lock:
+            if self._entries.pop(digest, None) is not None:
+                self._save()
+
+    def rebuild_from_rest(self, session, api_base_url, download=False):
+        """Rebuild the index from the media library listing
+
+        Hashes are read from our own filenames; with download=True any other
+        image is fetched and hashed too, which is slow but catches older uploads.
+        """
+        entries = {}
+        page = 1
+        while True:
+            response = session.get(
+                f"{api_base_url}/media",
+                params={'per_page': 100, 'page': page, 'media_type': 'image'}
+            )
+            response.raise_for_status()
+            items = response.json()
+            for item in items:
+                url = item.get('source_url', '')
+                match = HASH_IN_FILENAME.search(os.path.basename(url))
+                if match:
+                    digest = match.group(1)
+                elif download:
+                    try:
+                        media_response = session.get(url)
+                        media_response.raise_for_status()
+                        digest = content_hash(media_response.content)
+                    except Exception as e:
+                        print(f"Error hashing media {item.get('id')}: {e}")
+                        continue
+                else:
+                    continue
+                entries.setdefault(digest, {'id': item['id'], 'url': url})
+
+            total_pages = int(response.headers.get('X-WP-TotalPages', page))
+            if not items or page >= total_pages:
+                break
+            page += 1
+
+        with self._lock:
+            self._entries = entries
+            self._save()
+        print(f"Rebuilt media index with {len(entries)} entries")
+        return len(entries)
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_media_index(site):
+    """Return the process-wide media index for a site"""
+    with _indexes_lock:
+        if site not in _indexes:
+            _indexes[site] = MediaIndex(site)
+        return _indexes[site]
+
+def main():
+    """Rebuild the media index for the blog in blog-credentials.json"""
+    import argparse
+    import requests
+    from requests.auth import HTTPBasicAuth
+
+    parser = argparse.ArgumentParser(description="Rebuild the local media dedup index from WordPress")
+    parser.add_argument('--credentials', default='blog-credentials.json', help="Path to the credentials file")
+    parser.add_argument('--download', action='store_true', help="Also download and hash media we didn't upload")
+    args = parser.parse_args()
+
+    with open(args.credentials, 'r') as f:
+        credentials = json.load(f)
+
+    # Same site URL handling as the REST client
+    site_url = credentials.get('site_url') or credentials['xmlrpc_url'].replace('/xmlrpc.php', '')
+    api_base_url = f"{site_url.rstrip('/')}/wp-json/wp/v2"
+
+    session = requests.Session()
+    session.auth = HTTPBasicAuth(credentials['username'], credentials['password'])
+    get_media_index(api_base_url).rebuild_from_rest(session, api_base_url, download=args.download)
+
+if __name__ == "__main__":
+    main()
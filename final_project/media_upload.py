@@ -0,0 +1,127 @@
+"""
+Media Upload
+------------
+Upload generated images to WordPress straight from memory. No temporary
+files, so concurrent runs sharing a working directory can't clobber each
+other and the pod never holds an image both on disk and in RAM. Bytes that
+are already in the media library (per the media index) aren't sent again,
+as long as the attachment is still there: each index hit is checked once per
+run, and an entry whose attachment was deleted is dropped and re-uploaded.
+"""
+
+from xmlrpc import client as xmlrpc_client
+
+from media_index import content_hash, get_media_index, hashed_filename
+
+# Index hits already confirmed to exist on the site during this run
+_verified = set()
+
+def known_attachment(index, digest, exists):
+    """Return the indexed attachment for a hash if it still exists, dropping the entry if it doesn't
+
+    exists(attachment_id) returns True, False, or None when it can't tell.
+    """
+    known = index.get(digest)
+    if not known or (index.site, digest) in _verified:
+        return known
+    try:
+        found = exists(known['id'])
+    except Exception as e:
+        # Can't reach the site to check: the upload would fail just the same
+        print(f"Error checking media {known['id']}, assuming it still exists: {e}")
+        return known
+    if found is False:
+        print(f"Media {known['id']} for image {digest} is gone from the site, uploading again")
+        index.remove(digest)
+        return None
+    _verified.add((index.site, digest))
+    return known
+
+def as_bytes(data):
+    """Return the raw bytes behind bytes, a memoryview or a file-like buffer"""
+    if isinstance(data, bytes):
+        return data
+    if isinstance(data, (bytearray, memoryview)):
+        return bytes(data)
+    if hasattr(data, 'getvalue'):
+        return data.getvalue()
+    return data.read()
+
+def upload_media_rest(wp_client, data, filename, mime_type, alt_text=None, caption=None):
+    """Upload bytes or a buffer to the media library via the REST API and return the attachment"""
+    data = as_bytes(data)
+
+    # Identical bytes already in the media library? Reuse that attachment
+    digest = content_hash(data)
+    index = get_media_index(wp_client['api_base_url'])
+
+    def exists(attachment_id):
+        response = wp_client['session'].get(
+            f"{wp_client['api_base_url']}/media/{attachment_id}", params={'_fields': 'id'}
+        )
+        if response.status_code in (404, 410):
+            return False
+        return response.ok or None
+
+    known = known_attachment(index, digest, exists)
+    if known:
+        print(f"Reusing media {known['id']} for identical image {digest}")
+        return {'id': known['id'], 'source_url': known['url']}
+
+    # Attachment fields ride along as query parameters, so the body is just the file
+    params = {}
+    if alt_text:
+        params['alt_text'] = alt_text
+    if caption:
+        params['caption'] = caption
+
+    response = wp_client['session'].post(
+        f"{wp_client['api_base_url']}/media",
+        params=params,
+        data=data,
+        headers={
+            'Content-Type': mime_type,
+            'Content-Disposition': f'attachment; filename="{hashed_filename(filename, digest)}"'
+        }
+    )
+    response.raise_for_status()
+    attachment = response.json()
+    index.add(digest, attachment['id'], attachment['source_url'])
+    return attachment
+
+def upload_media_xmlrpc(wp, data, filename, mime_type, caption=None):
+    """Upload bytes or a buffer to the media library via XML-RPC and return the upload response"""
+    # Imported here so REST-only deployments don't need python-wordpress-xmlrpc
+    from wordpress_xmlrpc.methods import media
+
+    data = as_bytes(data)
+
+    # Identical bytes already in the media library? Reuse that attachment
+    digest = content_hash(data)
+    index = get_media_index(wp.url.replace('/xmlrpc.php', '/wp-json/wp/v2'))
+
+    def exists(attachment_id):
+        try:
+            wp.call(media.GetMediaItem(attachment_id))
+        except xmlrpc_client.Fault as e:
+            # WordPress answers a deleted attachment with 404 "Invalid attachment ID."
+            if e.faultCode == 404:
+                return False
+            raise
+        return True
+
+    known = known_attachment(index, digest, exists)
+    if known:
+        print(f"Reusing media {known['id']} for identical image {digest}")
+        return {'id': known['id'], 'url': known['url']}
+
+    payload = {
+        'name': hashed_filename(filename, digest),
+        'type': mime_type,
+        'bits': xmlrpc_client.Binary(data)
+    }
+    if caption:
+        payload['caption'] = caption
+    response = wp.call(media.UploadFile(payload))
+    index.add(digest, response['id'], response['url'])
+    return response
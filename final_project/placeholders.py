@@ -0,0 +1,57 @@
+"""
+Placeholders
+------------
+One tokenizer for every image placeholder syntax Claude likes to invent:
+
+    ![Image: description](image-placeholder)
+    [IMAGE: description]  [Image: description]  [image: description]
+    {{IMAGE: description}}  {{image: description}}
+
+All of them are found in a single left-to-right scan, and replacements are
+stitched back together with a single join.
+"""
+
+import re
+
+# Alternation order matters: the Markdown form has to win over the bare [Image: ...]
+# inside it. Descriptions never span lines or cross a closing bracket.
+PLACEHOLDER_PATTERN = re.compile(
+    r'!\[Image:[ \t]*(?P<markdown>[^\]\n]*?)[ \t]*\]\(image-placeholder\)'
+    r'|\[(?:IMAGE|Image|image):[ \t]*(?P<bracket>[^\]\n]*?)[ \t]*\]'
+    r'|\{\{(?:IMAGE|Image|image):[ \t]*(?P<brace>[^}\n]*?)[ \t]*\}\}'
+)
+
+def find_placeholders(content):
+    """Return every image placeholder in the content, in document order"""
+    placeholders = []
+    for match in PLACEHOLDER_PATTERN.finditer(content):
+        description = match.group('markdown')
+        if description is None:
+            description = match.group('bracket')
+        if description is None:
+            description = match.group('brace')
+        placeholders.append({
+            'full_match': match.group(0),
+            'description': description,
+            'start': match.start(),
+            'end': match.end()
+        })
+    return placeholders
+
+def unique_descriptions(placeholders):
+    """Return each placeholder description once, in order of first appearance"""
+    return list(dict.fromkeys(placeholder['description'] for placeholder in placeholders))
+
+def replace_placeholders(content, placeholders, replacements):
+    """Replace each placeholder span with its replacement, in document order, with a single join"""
+    pieces = []
+    position = 0
+    for placeholder, replacement in sorted(zip(placeholders, replacements), key=lambda pair: pair[0]['start']):
+        # Skip spans that overlap one we already replaced
+        if placeholder['start'] < position:
+            continue
+        pieces.append(content[position:placeholder['start']])
+        pieces.append(replacement)
+        position = placeholder['end']
+    pieces.append(content[position:])
+    return "".join(pieces)
@@ -0,0 +1,103 @@
+"""
+Post Metadata
+-------------
+Split-model generation: the primary model writes the title and body, and a
+cheaper, faster model derives the tags, meta description, excerpt and focus
+keyphrase from them in a second call. That call runs in the background while
+images render, so it stays off the critical path, and the expensive model
+spends no output tokens on metadata.
+"""
+
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from bedrock_client import get_bedrock_client
+from prompt_budget import truncate_to_tokens
+from structured_output import parse_json_output
+
+# Off by default: the primary model keeps writing the metadata itself
+SPLIT_METADATA = os.environ.get("SPLIT_METADATA", "0") == "1"
+METADATA_MODEL_ID = os.environ.get("METADATA_MODEL_ID", "anthropic.claude-3-haiku-20240307-v1:0")
+
+# The opening of a post says enough to tag and summarize it
+METADATA_BODY_TOKENS = 1500
+
+FIELD_INSTRUCTIONS = {
+    'meta_description': "a compelling SEO meta description, 150-160 characters",
+    'tags': "an array of 3-5 relevant tags",
+    'excerpt': "a brief excerpt of about 55 words",
+    'focus_keyphrase': "a focus keyphrase for SEO, 2-4 words"
+}
+
+_metadata_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="metadata-worker")
+
+def fallback_metadata(title, body, fields):
+    """Derive passable metadata locally when the metadata model lets us down"""
+    text = " ".join(re.sub(r'<[^>]+>|[#*_`>\[\]]', ' ', body).split())
+    metadata = {}
+    if 'meta_description' in fields:
+        metadata['meta_description'] = truncate_to_tokens(text, 39)
+    if 'excerpt' in fields:
+        metadata['excerpt'] = " ".join(text.split()[:55])
+    if 'tags' in fields:
+        metadata['tags'] = []
+    if 'focus_keyphrase' in fields:
+        metadata['focus_keyphrase'] = " ".join(title.split()[:4])
+    return metadata
+
+def generate_metadata(title, body, fields, region):
+    """Ask the metadata model for the given fields, falling back to local defaults"""
+    spec = "\n".join(f"- {field}: {FIELD_INSTRUCTIONS[field]}" for field in fields)
+    prompt = f"""Here is a blog post.
+
+Title: {title}
+
+{truncate_to_tokens(body, METADATA_BODY_TOKENS)}
+
+Write the following metadata for it:
+{spec}
+
+Respond with only a JSON object with exactly these keys: {", ".join(fields)}"""
+
+    try:
+        response = get_bedrock_client(region).invoke_model(
+            modelId=METADATA_MODEL_ID,
+            body=json.dumps({
+                "anthropic_version": "bedrock-2023-05-31",
+                "max_tokens": 512,
+                "temperature": 0.3,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ]
+            })
+        )
+        response_body = json.loads(response['body'].read())
+        metadata = parse_json_output(response_body['content'][0]['text'], required=fields)
+    except Exception as e:
+        print(f"Error generating metadata with {METADATA_MODEL_ID}: {e}")
+        metadata = None
+
+    if not metadata:
+        print("Falling back to metadata derived from the post itself")
+        return fallback_metadata(title, body, fields)
+
+    if 'tags' in metadata and isinstance(metadata['tags'], str):
+        metadata['tags'] = [tag.strip() for tag in metadata['tags'].split(',') if tag.strip()]
+    print(f"Generated metadata with {METADATA_MODEL_ID}")
+    return {field: metadata[field] for field in fields}
+
+def submit_metadata(title, body, fields, region):
+    """Start generate_metadata in the background and return its future"""
+    return _metadata_pool.submit(generate_metadata, title, body, tuple(fields), region)
+
+def resolve_metadata(post_data):
+    """Wait for a pending metadata call, if any, and merge its fields into post_data"""
+    future = post_data.pop('metadata_future', None)
+    if future is not None:
+        post_data.update(future.result())
+    return post_data
@@ -0,0 +1,62 @@
+"""
+Post Stream
+-----------
+Parses the ---TITLE--- / ---CONTENT--- / ---META--- sections of Claude's
+response as the tokens arrive (streamed with hedging.stream_claude_text).
+Every image placeholder is announced the moment its closing bracket streams
+in, so image rendering can start while Claude is still writing the body.
+"""
+
+from hedging import stream_claude_text
+from placeholders import find_placeholders
+
+SECTION_MARKERS = ['---TITLE---', '---CONTENT---', '---META---']
+
+# No placeholder we care about is longer than this, so rescans only look this far back
+MAX_PLACEHOLDER_LENGTH = 500
+
+class SectionStreamParser:
+    """Incrementally tracks sections and completed image placeholders in streamed text"""
+
+    def __init__(self, on_placeholder=None, on_section=None):
+        self.on_placeholder = on_placeholder
+        self.on_section = on_section
+        self.text = ""
+        self.sections = {}
+        self.placeholders = []
+        self._seen_descriptions = set()
+        self._scan_from = 0
+
+    def feed(self, chunk):
+        """Add a chunk of streamed text and fire callbacks for anything newly complete"""
+        previous_length = len(self.text)
+        self.text += chunk
+
+        # Markers may be split across chunks, so look back a little for them too
+        for marker in SECTION_MARKERS:
+            if marker in self.sections:
+                continue
+            position = self.text.find(marker, max(0, previous_length - len(marker)))
+            if position != -1:
+                self.sections[marker] = position
+                if self.on_section:
+                    self.on_section(marker)
+
+        # Placeholders only live in the body, and only complete once a bracket closes
+        content_start = self.sections.get('---CONTENT---')
+        if content_start is None or not any(bracket in chunk for bracket in ']})'):
+            return
+        content_end = self.sections.get('---META---', len(self.text))
+        start = max(self._scan_from, content_start, previous_length - MAX_PLACEHOLDER_LENGTH)
+
+        for placeholder in find_placeholders(self.text[start:content_end]):
+            self._scan_from = start + placeholder['end']
+            description = placeholder['description']
+            # A Markdown placeholder can show up as [Image: ...] before its (image-placeholder)
+            # arrives; either way the description is the same, so announce it once
+            if description in self._seen_descriptions:
+                continue
+            self._seen_descriptions.add(description)
+            self.placeholders.append(description)
+            if self.on_placeholder:
+                self.on_placeholder(description)
@@ -0,0 +1,108 @@
+"""
+Prompt Budget
+-------------
+Builds the "here's how I write" part of the prompt under a token budget.
+Instead of pasting every recent post in full (which grows with every long
+post we publish), each post gets a share of the budget and is represented by
+its opening, its closing and evenly spaced paragraphs from the middle.
+"""
+
+import math
+import os
+import re
+
+# Tokens we are willing to spend on style examples per prompt
+PROMPT_STYLE_TOKEN_BUDGET = int(os.environ.get("PROMPT_STYLE_TOKEN_BUDGET", "3000"))
+
+# Claude averages roughly four characters of English per token
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text):
+    """Rough token count for text, erring on the high side"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def split_paragraphs(text):
+    """Split text into paragraphs with whitespace collapsed"""
+    paragraphs = []
+    for block in re.split(r'\n\s*\n|\r\n\s*\r\n', text):
+        paragraph = " ".join(block.split())
+        if paragraph:
+            paragraphs.append(paragraph)
+    # Plain-text renders of HTML often only have single newlines between paragraphs
+    if len(paragraphs) <= 1 and '\n' in text:
+        paragraphs = [" ".join(line.split()) for line in text.splitlines() if line.strip()]
+    return paragraphs
+
+def truncate_to_tokens(text, budget):
+    """Cut text at a word boundary so it fits in budget tokens"""
+    max_chars = budget * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(' ', 0, max_chars - 1)
+    return text[:cut if cut > 0 else max_chars - 1].rstrip() + "…"
+
+def sample_paragraphs(paragraphs, budget):
+    """Pick the opening, the closing and evenly spaced middle paragraphs that fit in budget tokens"""
+    if not paragraphs or budget <= 0:
+        return []
+
+    # The first and last paragraphs say the most about voice: how we open and sign off
+    order = [0]
+    if len(paragraphs) > 1:
+        order.append(len(paragraphs) - 1)
+    middle = list(range(1, len(paragraphs) - 1))
+    # Visit the middle coarse to fine (halves, then quarters, ...) so any prefix of
+    # the order is spread across the whole post rather than bunched at the start
+    step = len(middle)
+    while middle and step >= 1:
+        for i in range(step // 2, len(middle), step):
+            if middle[i] not in order:
+                order.append(middle[i])
+        step //= 2
+
+    chosen = set()
+    remaining = budget
+    for index in order:
+        cost = estimate_tokens(paragraphs[index]) + 1
+        if cost <= remaining:
+            chosen.add(index)
+            remaining -= cost
+
+    if not chosen:
+        # Even the opening paragraph is too long: keep as much of it as fits
+        return [truncate_to_tokens(paragraphs[0], budget)]
+
+    return [paragraphs[index] for index in sorted(chosen)]
+
+def format_style_examples(posts, budget=None, max_posts=3):
+    """Render up to max_posts posts as style examples within budget tokens
+
+    Returns the text and its estimated token count.
+    """
+    if budget is None:
+        budget = PROMPT_STYLE_TOKEN_BUDGET
+    posts = list(posts)[:max_posts]
+    if not posts:
+        return "", 0
+
+    examples = []
+    remaining = budget
+    for i, post in enumerate(posts):
+        header = f"Title: {post.get('title', '')}"
+        if post.get('categories'):
+            header += f"\nCategories: {', '.join(post['categories'])}"
+        header += "\n\nContent: "
+
+        # Split what's left evenly between this post and the ones after it, so
+        # a short post hands its unused share to the next one
+        share = remaining // (len(posts) - i) - estimate_tokens(header)
+        content = "\n\n".join(sample_paragraphs(split_paragraphs(post.get('content', '')), share))
+
+        example = header + content
+        examples.append(example)
+        remaining -= estimate_tokens(example)
+
+    text = "\n\n".join(examples)
+    tokens = estimate_tokens(text)
+    print(f"Style examples: {len(examples)} posts, ~{tokens} tokens (budget {budget})")
+    return text, tokens
@@ -0,0 +1,94 @@
+"""
+Prompt Cache
+------------
+Splits the post prompt into a stable prefix (persona, style profile or
+examples, instructions, response format) and a small variable suffix (date,
+topic, GitHub activity). On models that support Bedrock prompt caching the
+prefix is marked with cache_control, so repeated runs skip re-processing it.
+Because a single changed byte turns every cache read into a write, the prefix
+is also compared with the one sent last time and any drift is reported.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from prompt_budget import estimate_tokens
+
+# auto: cache on models that support it, 1: always mark the prefix, 0: never
+PROMPT_CACHING = os.environ.get("PROMPT_CACHING", "auto")
+
+# Claude models on Bedrock that accept cache_control (matched anywhere in the
+# model ID, so cross-region inference profiles like us.anthropic... match too)
+PROMPT_CACHE_MODELS = (
+    "anthropic.claude-3-5-haiku",
+    "anthropic.claude-3-7-sonnet",
+    "anthropic.claude-sonnet-4",
+    "anthropic.claude-opus-4",
+    "anthropic.claude-haiku-4"
+)
+
+# Bedrock won't cache a shorter prefix than this, so marking it would be noise
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+CACHE_DIR = os.environ.get("AI_BUTLER_CACHE_DIR", os.path.expanduser("~/.cache/ai-butler"))
+
+PROMPT_PREFIX_PATH = os.environ.get("PROMPT_PREFIX_PATH", os.path.join(CACHE_DIR, "prompt-prefixes.json"))
+
+def prompt_caching_enabled(model_id):
+    """Whether the prefix should be marked for provider-side caching on this model"""
+    if PROMPT_CACHING == "auto":
+        return any(model in model_id for model in PROMPT_CACHE_MODELS)
+    return PROMPT_CACHING == "1"
+
+def user_message(model_id, prefix, suffix=""):
+    """Build the user message, marking the prefix as cacheable where the model supports it"""
+    if not prompt_caching_enabled(model_id) or estimate_tokens(prefix) < PROMPT_CACHE_MIN_TOKENS:
+        return {"role": "user", "content": prefix + suffix}
+
+    content = [{"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}}]
+    if suffix:
+        content.append({"type": "text", "text": suffix})
+    return {"role": "user", "content": content}
+
+def _load_prefixes(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def check_prefix_stability(name, prefix, path=PROMPT_PREFIX_PATH):
+    """Compare a prompt prefix with the one last sent under the same name and report any drift
+
+    Returns True if the prefix is byte-identical to last time.
+    """
+    data = _load_prefixes(path)
+    digest = hashlib.sha256(prefix.encode('utf-8')).hexdigest()
+    previous = data.get(name)
+
+    if previous and previous['sha256'] == digest:
+        age_hours = (time.time() - previous['since']) / 3600
+        print(f"Prompt prefix '{name}' unchanged for {age_hours:.1f}h (~{estimate_tokens(prefix)} tokens)")
+        return True
+
+    if previous:
+        old = previous.get('text', '')
+        offset = next((i for i, (a, b) in enumerate(zip(old, prefix)) if a != b), min(len(old), len(prefix)))
+        print(f"Prompt prefix '{name}' changed at character {offset}: "
+              f"{old[offset:offset + 40]!r} -> {prefix[offset:offset + 40]!r}")
+    else:
+        print(f"Recording prompt prefix '{name}' (~{estimate_tokens(prefix)} tokens)")
+
+    data[name] = {'sha256': digest, 'since': time.time(), 'text': prefix}
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Error saving prompt prefix: {e}")
+    return False
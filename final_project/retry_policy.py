@@ -0,0 +1,151 @@
+"""
+Retry Policy
+------------
+One retry policy for every model call: exponential backoff with jitter,
+throttling handled differently from bad requests, a circuit breaker that
+stops hammering a model that keeps failing, and a per-post time budget so a
+Bedrock brownout can't push one hourly run into the next.
+"""
+
+import os
+import random
+import threading
+import time
+
+MAX_ATTEMPTS = int(os.environ.get("RETRY_MAX_ATTEMPTS", "3"))
+BASE_DELAY = float(os.environ.get("RETRY_BASE_DELAY", "1.0"))
+MAX_DELAY = float(os.environ.get("RETRY_MAX_DELAY", "20.0"))
+
+# Consecutive failures before we stop calling a model for the rest of the run
+CIRCUIT_BREAKER_THRESHOLD = int(os.environ.get("CIRCUIT_BREAKER_THRESHOLD", "3"))
+
+# Seconds a single post may spend on images before we fall back to text
+IMAGE_TIME_BUDGET = float(os.environ.get("IMAGE_TIME_BUDGET", "300"))
+
+# Bedrock says "slow down": worth waiting for, with a longer backoff
+THROTTLING_CODES = {
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'ServiceUnavailableException',
+    'ModelNotReadyException',
+    'ModelTimeoutException',
+    'InternalServerException'
+}
+
+# Bedrock says "this request is wrong": retrying the same request won't help
+VALIDATION_CODES = {
+    'ValidationException',
+    'AccessDeniedException',
+    'ResourceNotFoundException',
+    'ModelErrorException'
+}
+
+class RetryAborted(Exception):
+    """Raised when we give up on a call without (another) attempt"""
+
+class CircuitOpenError(RetryAborted):
+    """Raised when a model's circuit breaker has tripped"""
+
+class DeadlineExceeded(RetryAborted):
+    """Raised when the time budget for a post has run out"""
+
+class Deadline:
+    """A point in time after which we stop trying"""
+
+    def __init__(self, seconds=IMAGE_TIME_BUDGET):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        """Seconds left before the deadline"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        """Whether the deadline has passed"""
+        return self.remaining() <= 0
+
+class CircuitBreaker:
+    """Counts consecutive failures for a model and opens after too many"""
+
+    def __init__(self, threshold=CIRCUIT_BREAKER_THRESHOLD):
+        self.threshold = threshold
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def is_open(self):
+        """Whether calls to this model should be skipped"""
+        with self._lock:
+            return self.failures >= self.threshold
+
+    def record_success(self):
+        """Reset the failure count after a good call"""
+        with self._lock:
+            self.failures = 0
+
+    def record_failure(self):
+        """Count a failure and return True if the breaker is now open"""
+        with self._lock:
+            self.failures += 1
+            return self.failures >= self.threshold
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_circuit_breaker(model_id):
+    """Return the run-wide circuit breaker for a model"""
+    with _breakers_lock:
+        if model_id not in _breakers:
+            _breakers[model_id] = CircuitBreaker()
+        return _breakers[model_id]
+
+def classify_error(error):
+    """Sort an exception into 'throttled', 'invalid' or 'transient'"""
+    response = getattr(error, 'response', None)
+    code = response.get('Error', {}).get('Code') if isinstance(response, dict) else None
+    if code in THROTTLING_CODES:
+        return 'throttled'
+    if code in VALIDATION_CODES:
+        return 'invalid'
+    # Timeouts, dropped connections and anything unexpected get a normal retry
+    return 'transient'
+
+def backoff_delay(attempt, kind):
+    """Full-jitter exponential backoff; throttling starts from a longer base"""
+    base = BASE_DELAY * (2 if kind == 'throttled' else 1)
+    return random.uniform(0, min(MAX_DELAY, base * (2 ** attempt)))
+
+def call_with_retry(func, model_id, deadline=None, max_attempts=MAX_ATTEMPTS):
+    """Call func() under the shared retry policy for model_id and return its result"""
+    breaker = get_circuit_breaker(model_id)
+
+    for attempt in range(max_attempts):
+        if breaker.is_open():
+            raise CircuitOpenError(f"Circuit breaker open for {model_id}, not calling it again this run")
+        if deadline and deadline.expired():
+            raise DeadlineExceeded(f"Time budget exhausted before calling {model_id}")
+
+        try:
+            result = func()
+        except Exception as e:
+            kind = classify_error(e)
+            if kind == 'invalid':
+                # The request itself is bad, so it says nothing about the model's health
+                print(f"{model_id} rejected the request, not retrying: {e}")
+                raise
+
+            if breaker.record_failure():
+                print(f"{model_id} failed {breaker.failures} times in a row, opening circuit breaker")
+                raise
+
+            if attempt + 1 >= max_attempts:
+                raise
+
+            delay = backoff_delay(attempt, kind)
+            if deadline and delay >= deadline.remaining():
+                raise DeadlineExceeded(f"Time budget too short to retry {model_id}") from e
+
+            print(f"{model_id} {kind} error on attempt {attempt + 1}/{max_attempts}: {e}; retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        breaker.record_success()
+        return result
@@ -0,0 +1,196 @@
+"""
+Tag Index
+---------
+A local map from tag name to WordPress tag ID, so publishing a post resolves
+its handful of tags without paging through every tag on the site. Names the
+index doesn't know are caught up incrementally (tags newer than the newest
+one we have seen), then looked up by slug and search, and only then created.
+Lookups and creates for the names of one post run concurrently.
+`python tag_index.py` rebuilds the index from scratch.
+"""
+
+import asyncio
+import html
+import json
+import os
+import re
+import tempfile
+import threading
+
+import requests
+
+CACHE_DIR = os.environ.get("AI_BUTLER_CACHE_DIR", os.path.expanduser("~/.cache/ai-butler"))
+
+TAG_INDEX_PATH = os.environ.get("TAG_INDEX_PATH", os.path.join(CACHE_DIR, "tag-index.json"))
+
+def tag_key(name):
+    """Normalize a tag name (as sent, or HTML-escaped as WordPress returns it) for lookups"""
+    return " ".join(html.unescape(name).lower().split())
+
+def tag_slug(name):
+    """Approximate the slug WordPress derives from a tag name"""
+    return re.sub(r'[^a-z0-9]+', '-', tag_key(name)).strip('-')
+
+class TagIndex:
+    """Tag name to ID index for one WordPress site, persisted as JSON"""
+
+    def __init__(self, site, path=TAG_INDEX_PATH):
+        self.site = site
+        self.path = path
+        self._lock = threading.Lock()
+        stored = self._load().get(site, {})
+        self._tags = stored.get('tags', {})
+        # Tags with a higher ID than this haven't been seen yet; catch_up() fetches them
+        self._max_id = stored.get('max_id', 0)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        # Merge with whatever is on disk so other sites' entries survive
+        data = self._load()
+        data[self.site] = {'tags': self._tags, 'max_id': self._max_id}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Error saving tag index: {e}")
+
+    def get(self, name):
+        """Return the known tag ID for a name, or None"""
+        with self._lock:
+            return self._tags.get(tag_key(name))
+
+    def add(self, tags, complete_up_to=None):
+        """Remember tags ({'id', 'name'} dicts from the REST API)"""
+        with self._lock:
+            for tag in tags:
+                self._tags[tag_key(tag['name'])] = tag['id']
+            if complete_up_to is not None:
+                self._max_id = max(self._max_id, complete_up_to)
+            self._save()
+
+    async def catch_up(self, client):
+        """Add tags created since the newest one we know, newest first until we reach it"""
+        if not self._max_id:
+            # A fresh index starts from the newest tag; older names are looked up as needed
+            tags = await client.get_tags(orderby='id', order='desc', per_page=1, _fields='id,name')
+            self.add(tags, complete_up_to=max([tag['id'] for tag in tags], default=0))
+            return 0
+        newest = self._max_id
+        new_tags = []
+        page = 1
+        while True:
+            tags = await client.get_tags(orderby='id', order='desc', per_page=100, page=page, _fields='id,name')
+            fresh = [tag for tag in tags if tag['id'] > self._max_id]
+            new_tags.extend(fresh)
+            newest = max([newest] + [tag['id'] for tag in fresh])
+            if len(fresh) < len(tags) or len(tags) < 100:
+                break
+            page += 1
+        self.add(new_tags, complete_up_to=newest)
+        return len(new_tags)
+
+    async def rebuild(self, client):
+        """Rebuild the index from the full tag listing"""
+        tags = [tag async for tag in client.iter_collection('tags', _fields='id,name')]
+
+        with self._lock:
+            self._tags = {}
+            self._max_id = 0
+        self.add(tags, complete_up_to=max([tag['id'] for tag in tags], default=0))
+        print(f"Rebuilt tag index with {len(tags)} tags")
+        return len(tags)
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_tag_index(site):
+    """Return the process-wide tag index for a site"""
+    with _indexes_lock:
+        if site not in _indexes:
+            _indexes[site] = TagIndex(site)
+        return _indexes[site]
+
+async def find_tag(client, name):
+    """Look a tag up on the site by slug, then by search; return it or None"""
+    key = tag_key(name)
+    for params in ({'slug': tag_slug(name)}, {'search': name}):
+        for tag in await client.get_tags(_fields='id,name', per_page=20, **params):
+            if tag_key(tag['name']) == key:
+                return tag
+    return None
+
+async def find_or_create_tag(client, name):
+    """Return the tag for a name, creating it if the site doesn't have it"""
+    tag = await find_tag(client, name)
+    if tag:
+        return tag
+    try:
+        return await client.create_tag(name)
+    except requests.HTTPError as e:
+        # Created by someone else since we looked: WordPress tells us its ID
+        try:
+            error = e.response.json()
+        except ValueError:
+            raise e
+        if error.get('code') == 'term_exists':
+            return {'id': error['data']['term_id'], 'name': name}
+        raise
+
+async def resolve_tags(client, tag_names):
+    """Return the IDs for tag_names, in order, touching the site only for names the index doesn't know"""
+    index = get_tag_index(client.api_base_url)
+    missing = list({tag_key(name): name for name in tag_names if index.get(name) is None}.values())
+
+    if missing:
+        caught_up = await index.catch_up(client)
+        if caught_up:
+            print(f"Tag index caught up with {caught_up} new tags")
+        missing = [name for name in missing if index.get(name) is None]
+
+    if missing:
+        results = await asyncio.gather(*(find_or_create_tag(client, name) for name in missing), return_exceptions=True)
+        found = []
+        for name, result in zip(missing, results):
+            if isinstance(result, Exception):
+                print(f"Error resolving tag '{name}': {result}")
+            else:
+                found.append({'id': result['id'], 'name': name})
+        index.add(found)
+
+    tag_ids = []
+    for name in tag_names:
+        tag_id = index.get(name)
+        if tag_id is not None and tag_id not in tag_ids:
+            tag_ids.append(tag_id)
+    return tag_ids
+
+def main():
+    """Rebuild the tag index for the blog in blog-credentials.json"""
+    import argparse
+    from wp_client import AsyncWordPressClient, create_session
+
+    parser = argparse.ArgumentParser(description="Rebuild the local tag name index from WordPress")
+    parser.add_argument('--credentials', default='blog-credentials.json', help="Path to the credentials file")
+    args = parser.parse_args()
+
+    with open(args.credentials, 'r') as f:
+        credentials = json.load(f)
+
+    # Same site URL handling as the REST client
+    site_url = credentials.get('site_url') or credentials['xmlrpc_url'].replace('/xmlrpc.php', '')
+    api_base_url = f"{site_url.rstrip('/')}/wp-json/wp/v2"
+
+    client = AsyncWordPressClient(create_session(credentials['username'], credentials['password']), api_base_url)
+    asyncio.run(get_tag_index(api_base_url).rebuild(client))
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,14 @@
-import boto3
+import argparse
 import json
-import os
 import re
 import base64
-import random
-import tempfile
 from wordpress_xmlrpc import Client, WordPressPost
-from wordpress_xmlrpc.methods import posts, media
 from wordpress_xmlrpc.methods.posts import NewPost
-from wordpress_xmlrpc.compat import xmlrpc_client
+from bedrock_client import get_bedrock_client, get_bedrock_image_client
+from image_cache import get_image_cache, image_cache_key, seed_for_prompt
+from image_pipeline import IMAGE_CONCURRENCY, process_images_xmlrpc
+from llm_cache import add_llm_cache_arguments, configure_llm_cache, get_llm_cache
+from retry_policy import call_with_retry
 
 # Constants
 AWS_REGION = "us-west-2"  # Explicitly set to us-west-2
@@ -23,59 +23,61 @@ def get_wp_credentials():
         print(f"Error loading credentials: {e}")
         return None
 
-def generate_image_with_bedrock(description):
+def generate_image_with_bedrock(description, deadline=None):
     """Generate an image using Amazon Bedrock's Stable Diffusion model instead of Titan"""
-    for attempt in range(2):  # Try up to 2 times
-        try:
-            print(f"Starting image generation attempt {attempt + 1} for: '{description}'")
-            bedrock_runtime = boto3.client(
-                service_name="bedrock-runtime",
-                region_name=AWS_REGION
-            )
-            
-            # Clean up the description if it ends with .jpg or other file extensions
-            if description.endswith('.jpg') or description.endswith('.png'):
-                description = description.rsplit('.', 1)[0]
-            
-            # Handle hyphenated descriptions by replacing with spaces
-            description = description.replace('-', ' ')
-            
-            # Make the prompt more generic and shorter to avoid validation errors
-            if len(description) > 50:
-                safe_description = description[:50]
-            else:
-                safe_description = description
-                
-            # Make the prompt even safer by removing potentially problematic words
-            safe_description = safe_description.replace("banging", "typing on")
-            safe_description = safe_description.replace("frustrated", "tired")
-            safe_description = safe_description.replace("angry", "unhappy")
-            
-            # Use Stable Diffusion instead of Titan
-            # Prepare the request for Stable Diffusion
-            request_body = {
-                "text_prompts": [
-                    {
-                        "text": f"A simple cartoon illustration of {safe_description}, digital art style, clean lines",
-                        "weight": 1.0
-                    },
-                    {
-                        "text": "blurry, distorted, low quality, nsfw, violent",
-                        "weight": -1.0
-                    }
-                ],
-                "cfg_scale": 7.0,
-                "seed": random.randint(0, 4294967295),
-                "steps": 30,
-                "width": 512,
-                "height": 512
-            }
+    try:
+        print(f"Starting image generation for: '{description}'")
+        
+        # Clean up the description if it ends with .jpg or other file extensions
+        if description.endswith('.jpg') or description.endswith('.png'):
+            description = description.rsplit('.', 1)[0]
+        
+        # Handle hyphenated descriptions by replacing with spaces
+        description = description.replace('-', ' ')
+        
+        # Make the prompt more generic and shorter to avoid validation errors
+        if len(description) > 50:
+            safe_description = description[:50]
+        else:
+            safe_description = description
             
+        # Make the prompt even safer by removing potentially problematic words
+        safe_description = safe_description.replace("banging", "typing on")
+        safe_description = safe_description.replace("frustrated", "tired")
+        safe_description = safe_description.replace("angry", "unhappy")
+        
+        # Use Stable Diffusion instead of Titan
+        # Prepare the request for Stable Diffusion
+        image_model_id = "stability.stable-diffusion-xl-v1"
+        prompt_text = f"A simple cartoon illustration of {safe_description}, digital art style, clean lines"
+        negative_text = "blurry, distorted, low quality, nsfw, violent"
+        seed = seed_for_prompt(image_model_id, prompt_text)
+        request_body = {
+            "text_prompts": [
+                {
+                    "text": prompt_text,
+                    "weight": 1.0
+                },
+                {
+                    "text": negative_text,
+                    "weight": -1.0
+                }
+            ],
+            "cfg_scale": 7.0,
+            "seed": seed,
+            "steps": 30,
+            "width": 512,
+            "height": 512
+        }
+        cache_key = image_cache_key(image_model_id, prompt_text, 512, 512, 7.0, 30, seed, negative_text)
+        
+        def render():
+            bedrock_runtime = get_bedrock_image_client(AWS_REGION, deadline)
             print(f"Calling Bedrock with request: {json.dumps(request_body)}")
             
             # Call Bedrock's Stable Diffusion model
             response = bedrock_runtime.invoke_model(
-                modelId="stability.stable-diffusion-xl-v1",
+                modelId=image_model_id,
                 body=json.dumps(request_body)
             )
             
@@ -84,116 +86,31 @@ def generate_image_with_bedrock(description):
             
             if 'artifacts' in response_body and len(response_body['artifacts']) > 0:
                 print(f"Found {len(response_body['artifacts'])} images")
-                image_data = base64.b64decode(response_body['artifacts'][0]['base64'])
-                
-                # Save to a temporary file
-                temp_image = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
-                temp_image.write(image_data)
-                temp_image.close()
-                print(f"Image saved to temporary file: {temp_image.name}")
-                return temp_image.name
-            else:
-                print("No images found in response")
-                if attempt < 1:  # If this isn't the last attempt
-                    continue
-                return None
-        except Exception as e:
-            print(f"Error in attempt {attempt + 1} generating image: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            if attempt < 1:  # If this isn't the last attempt
-                print("Retrying image generation...")
-                continue
+                return base64.b64decode(response_body['artifacts'][0]['base64'])
+            print("No images found in response")
             return None
-    return None  # Should never reach here, but just in case
+        
+        # Serve reruns of the same prompt from the on-disk cache; fresh renders go
+        # through the shared retry policy, and the PNG bytes stay in memory
+        return get_image_cache().get_or_render(
+            cache_key,
+            lambda: call_with_retry(render, image_model_id, deadline)
+        )
+    except Exception as e:
+        print(f"Error generating image: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return None
 
-def process_images_in_content(content):
+def process_images_in_content(content, max_workers=IMAGE_CONCURRENCY):
     """Process all image placeholders in the content and replace them with actual images"""
     # Get WordPress credentials for media upload
     credentials = get_wp_credentials()
     if not credentials:
         print("Failed to get WordPress credentials")
         return content
-        
-    # Create WordPress client
-    wp = Client(
-        credentials['xmlrpc_url'],
-        credentials['username'],
-        credentials['password']
-    )
-    
-    # First, collect all placeholders with different patterns
-    image_patterns = [
-        r"\[IMAGE: (.*?)\]",
-        r"\[Image: (.*?)\]",
-        r"\[image: (.*?)\]"
-    ]
-    
-    # Store all placeholders with their positions
-    placeholders = []
-    
-    for pattern in image_patterns:
-        for match in re.finditer(pattern, content):
-            placeholders.append({
-                'full_match': match.group(0),
-                'description': match.group(1),
-                'start': match.start(),
-                'end': match.end()
-            })
-    
-    print(f"Found {len(placeholders)} total image placeholders")
-    
-    # Sort placeholders by position (to replace from end to beginning)
-    # This prevents position shifts when replacing text
-    placeholders.sort(key=lambda x: x['start'], reverse=True)
-    
-    # Process each placeholder
-    for placeholder in placeholders:
-        description = placeholder['description']
-        full_match = placeholder['full_match']
-        
-        print(f"Processing image placeholder: '{full_match}'")
-        
-        # Generate image using Bedrock
-        image_path = generate_image_with_bedrock(description)
-        
-        if image_path:
-            print(f"Image generated successfully at {image_path}")
-            try:
-                # Upload image to WordPress
-                with open(image_path, 'rb') as img:
-                    data = {
-                        'name': f'ai-generated-{random.randint(1000, 9999)}.png',
-                        'type': 'image/png',
-                        'bits': xmlrpc_client.Binary(img.read()),
-                        'caption': description
-                    }
-                
-                # Upload to WordPress
-                print(f"Uploading image for '{description}' to WordPress...")
-                response = wp.call(media.UploadFile(data))
-                img_url = response['url']
-                print(f"Image uploaded successfully, URL: {img_url}")
-                
-                # Replace placeholder with actual image HTML
-                image_html = f'<figure class="wp-block-image"><img src="{img_url}" alt="{description}"/><figcaption>{description}</figcaption></figure>'
-                
-                # Replace by slicing the content string at exact positions
-                content = content[:placeholder['start']] + image_html + content[placeholder['end']:]
-                print(f"Replaced placeholder at position {placeholder['start']}-{placeholder['end']}")
-                
-                # Clean up temporary file
-                os.unlink(image_path)
-            except Exception as e:
-                print(f"Error uploading image to WordPress: {e}")
-                # Replace with a text note since upload failed
-                content = content[:placeholder['start']] + f'<p><em>Image description: {description}</em></p>' + content[placeholder['end']:]
-        else:
-            print(f"Failed to generate image for '{description}', using placeholder text instead")
-            # Replace with a text note since image generation failed
-            content = content[:placeholder['start']] + f'<p><em>Image description: {description}</em></p>' + content[placeholder['end']:]
-    
-    return content
+
+    return process_images_xmlrpc(content, credentials, generate_image_with_bedrock, 'ai-generated', max_workers)
 
 def generate_butler_post():
     """Generate a blog post about the AI Blogging Butler"""
@@ -205,10 +122,7 @@ def generate_butler_post():
         print("Generating blog post about the AI Blogging Butler...")
         
         # Call Claude to generate the post
-        bedrock_runtime = boto3.client(
-            service_name="bedrock-runtime",
-            region_name=AWS_REGION
-        )
+        bedrock_runtime = get_bedrock_client(AWS_REGION)
         
         # Prepare the request for Claude
         request_body = {
@@ -223,15 +137,20 @@ def generate_butler_post():
             "temperature": 0.7
         }
         
-        # Call Claude
-        response = bedrock_runtime.invoke_model(
-            modelId=MODEL_ID,
-            body=json.dumps(request_body)
-        )
-        
-        # Process the response
-        response_body = json.loads(response['body'].read())
-        content = response_body['content'][0]['text']
+        # A retry after a failed publish reuses the post instead of writing a new one
+        llm_cache = get_llm_cache()
+        content = llm_cache.get(MODEL_ID, request_body)
+        if content is None:
+            # Call Claude
+            response = bedrock_runtime.invoke_model(
+                modelId=MODEL_ID,
+                body=json.dumps(request_body)
+            )
+            
+            # Process the response
+            response_body = json.loads(response['body'].read())
+            content = response_body['content'][0]['text']
+            llm_cache.put(MODEL_ID, request_body, content)
         
         print("\nRaw response from Claude (full response):")
         print(content)
@@ -287,4 +206,7 @@ def generate_butler_post():
         return False
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate and publish a post about the AI Blogging Butler")
+    add_llm_cache_arguments(parser)
+    configure_llm_cache(parser.parse_args())
     generate_butler_post()
@@ -0,0 +1,148 @@
+"""
+Image Cache
+-----------
+A content-addressed, size-bounded on-disk cache for generated images, so a
+rerun of the same post never pays Bedrock for the same render twice.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+CACHE_DIR = os.environ.get("AI_BUTLER_CACHE_DIR", os.path.expanduser("~/.cache/ai-butler"))
+
+# Where cached renders live and how big the cache may grow
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", os.path.join(CACHE_DIR, "images"))
+IMAGE_CACHE_MAX_MB = int(os.environ.get("IMAGE_CACHE_MAX_MB", "256"))
+
+def normalize_prompt(prompt):
+    """Normalize a prompt so cosmetic differences don't cause cache misses"""
+    # The SDXL/Titan text encoders are case-insensitive, so neither is the key
+    return " ".join(prompt.split()).lower()
+
+def seed_for_prompt(model_id, prompt):
+    """Derive a stable seed from the prompt so reruns can be served from the cache"""
+    digest = hashlib.sha256(f"{model_id}\n{normalize_prompt(prompt)}".encode('utf-8')).digest()
+    # Titan only accepts 31-bit seeds, SDXL takes anything up to 2^32 - 1
+    return int.from_bytes(digest[:4], 'big') & 0x7FFFFFFF
+
+def image_cache_key(model_id, prompt, width, height, cfg_scale, steps, seed, negative_prompt=""):
+    """Build the cache key for a render from everything that affects its pixels"""
+    fingerprint = json.dumps({
+        'model_id': model_id,
+        'prompt': normalize_prompt(prompt),
+        'negative_prompt': normalize_prompt(negative_prompt),
+        'size': [width, height],
+        'cfg_scale': float(cfg_scale),
+        'steps': steps,
+        'seed': seed
+    }, sort_keys=True)
+    return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+
+class ImageCache:
+    """Least-recently-used image cache stored as one file per key"""
+
+    def __init__(self, cache_dir=IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        # Fan out into subdirectories so a big cache doesn't live in one directory
+        return os.path.join(self.cache_dir, key[:2], f"{key}.bin")
+
+    def get(self, key):
+        """Return the cached bytes for key, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Touch the file so eviction sees it as recently used
+            os.utime(path, None)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Store bytes under key and evict the least recently used entries if over budget"""
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so readers never see a half-written image
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Error writing image cache entry {key[:12]}: {e}")
+            return
+
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        with self._lock:
+            entries = []
+            total = 0
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if not name.endswith('.bin'):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            # Oldest access time first
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+    def get_or_render(self, key, render):
+        """Return cached bytes for key, calling render() and caching its result on a miss"""
+        data = self.get(key)
+        if data is not None:
+            print(f"Image cache hit for {key[:12]}")
+            return data
+
+        data = render()
+        if data:
+            self.put(key, data)
+        return data
+
+    def stats(self):
+        """Return the hit/miss counters for this process"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+def get_image_cache():
+    """Return the process-wide image cache"""
+    global _image_cache
+    with _image_cache_lock:
+        if _image_cache is None:
+            _image_cache = ImageCache()
+        return _image_cache
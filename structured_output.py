@@ -0,0 +1,223 @@
+"""
+Structured Output
+-----------------
+One forgiving, single-pass reader for what Claude sends back when we ask for
+structure: a JSON object (possibly wrapped in prose or a ```json fence, with
+trailing commas, raw newlines or unescaped quotes inside strings), or plain
+text split into ---SECTION--- blocks with "Label: value" lines.
+
+Every parser here walks the text once, left to right, so a 1 MB response costs
+about as much as reading it; there are no backtracking regexes to blow up.
+"""
+
+import json
+import re
+
+# How many "{" in leading prose we try before giving up on finding the object
+MAX_START_ATTEMPTS = 8
+
+# The only characters that need attention inside a key...
+_STRING_SPECIAL = re.compile(r'["\\]')
+# ...and inside a value, where a quote can only be the closing one if JSON
+# structure follows it, so the regex engine skips every other quote for us
+_VALUE_SPECIAL = re.compile(r'\\|"(?=[ \t\r\n]*(?:[,}\]]|$))')
+_NUMBER = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?')
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+_LITERALS = {'true': True, 'false': False, 'null': None}
+_WHITESPACE = ' \t\r\n'
+
+class _TolerantJSONReader:
+    """Recursive-descent JSON reader that accepts the mistakes LLMs make"""
+
+    def __init__(self, text):
+        self.text = text
+        self.end = len(text)
+
+    def skip_whitespace(self, pos):
+        while pos < self.end and self.text[pos] in _WHITESPACE:
+            pos += 1
+        return pos
+
+    def read_value(self, pos):
+        pos = self.skip_whitespace(pos)
+        if pos >= self.end:
+            raise ValueError("Unexpected end of input")
+
+        char = self.text[pos]
+        if char == '{':
+            return self.read_object(pos + 1)
+        if char == '[':
+            return self.read_array(pos + 1)
+        if char == '"':
+            return self.read_string(pos + 1, is_key=False)
+        for literal, value in _LITERALS.items():
+            if self.text.startswith(literal, pos):
+                return value, pos + len(literal)
+        match = _NUMBER.match(self.text, pos)
+        if match:
+            number = match.group(0)
+            return (float(number) if any(c in number for c in '.eE') else int(number)), match.end()
+        raise ValueError(f"Unexpected character {char!r} at {pos}")
+
+    def read_object(self, pos):
+        result = {}
+        while True:
+            pos = self.skip_whitespace(pos)
+            if pos >= self.end:
+                raise ValueError("Unterminated object")
+            # A "}" right after a comma is a trailing comma, which we allow
+            if self.text[pos] == '}':
+                return result, pos + 1
+            if self.text[pos] != '"':
+                raise ValueError(f"Expected a key at {pos}")
+
+            key, pos = self.read_string(pos + 1, is_key=True)
+            pos = self.skip_whitespace(pos)
+            if pos >= self.end or self.text[pos] != ':':
+                raise ValueError(f"Expected ':' at {pos}")
+            result[key], pos = self.read_value(pos + 1)
+
+            pos = self.skip_whitespace(pos)
+            if pos < self.end and self.text[pos] == ',':
+                pos += 1
+            elif pos < self.end and self.text[pos] == '}':
+                return result, pos + 1
+            else:
+                raise ValueError(f"Expected ',' or '}}' at {pos}")
+
+    def read_array(self, pos):
+        result = []
+        while True:
+            pos = self.skip_whitespace(pos)
+            if pos >= self.end:
+                raise ValueError("Unterminated array")
+            if self.text[pos] == ']':
+                return result, pos + 1
+
+            value, pos = self.read_value(pos)
+            result.append(value)
+
+            pos = self.skip_whitespace(pos)
+            if pos < self.end and self.text[pos] == ',':
+                pos += 1
+            elif pos < self.end and self.text[pos] == ']':
+                return result, pos + 1
+            else:
+                raise ValueError(f"Expected ',' or ']' at {pos}")
+
+    def closes_string(self, pos):
+        # A quote inside a value only ends it if what follows looks like JSON
+        # structure; otherwise it's an unescaped quote, e.g. <a href="...">
+        after = self.skip_whitespace(pos + 1)
+        if after >= self.end or self.text[after] in '}]':
+            return True
+        if self.text[after] == ',':
+            following = self.skip_whitespace(after + 1)
+            return following >= self.end or self.text[following] in '"}]'
+        return False
+
+    def read_unicode_escape(self, pos):
+        # \uXXXX at pos, joining a \uD83D\uDE00 surrogate pair into one code point
+        try:
+            code = int(self.text[pos + 2:pos + 6], 16)
+        except ValueError:
+            return None, pos
+        if 0xD800 <= code <= 0xDBFF and self.text.startswith('\\u', pos + 6):
+            try:
+                low = int(self.text[pos + 8:pos + 12], 16)
+            except ValueError:
+                low = None
+            if low is not None and 0xDC00 <= low <= 0xDFFF:
+                return 0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00), pos + 12
+        return code, pos + 6
+
+    def read_string(self, pos, is_key):
+        pieces = []
+        special_chars = _STRING_SPECIAL if is_key else _VALUE_SPECIAL
+        while True:
+            match = special_chars.search(self.text, pos)
+            if not match:
+                raise ValueError("Unterminated string")
+            special = match.start()
+            # Raw newlines and tabs are kept as they are rather than rejected
+            pieces.append(self.text[pos:special])
+
+            if self.text[special] == '\\':
+                escape = self.text[special + 1:special + 2]
+                if escape == 'u':
+                    code, pos = self.read_unicode_escape(special)
+                    if code is not None:
+                        pieces.append(chr(code))
+                        continue
+                # Unknown escapes like \' keep the escaped character
+                pieces.append(_ESCAPES.get(escape, escape))
+                pos = special + 2
+                continue
+
+            if is_key or self.closes_string(special):
+                return "".join(pieces), special + 1
+            pieces.append('"')
+            pos = special + 1
+
+def parse_json_output(text, required=()):
+    """Extract the first JSON object from a model response, or None if there isn't a usable one"""
+    if not text:
+        return None
+
+    # strict=False lets raw newlines through; raw_decode ignores whatever follows
+    # the object, such as a closing ``` fence or a polite sign-off
+    decoder = json.JSONDecoder(strict=False)
+    reader = _TolerantJSONReader(text)
+
+    start = text.find('{')
+    attempts = 0
+    while start != -1 and attempts < MAX_START_ATTEMPTS:
+        attempts += 1
+        try:
+            value, _ = decoder.raw_decode(text, start)
+        except ValueError:
+            # Trailing commas, unescaped quotes and the like: take the slow(er) lane
+            try:
+                value, _ = reader.read_object(start + 1)
+            except (ValueError, RecursionError):
+                value = None
+
+        if isinstance(value, dict):
+            missing = [field for field in required if field not in value]
+            if not missing:
+                return value
+            print(f"JSON output is missing fields: {', '.join(missing)}")
+
+        # Prose before the object can contain braces of its own
+        start = text.find('{', start + 1)
+
+    return None
+
+def split_sections(text, markers):
+    """Split text on markers like ---TITLE---, returning the stripped text after each one found"""
+    sections = {}
+    found = []
+    position = 0
+    for marker in markers:
+        index = text.find(marker, position)
+        if index == -1:
+            continue
+        found.append((marker, index))
+        position = index + len(marker)
+
+    for i, (marker, index) in enumerate(found):
+        end = found[i + 1][1] if i + 1 < len(found) else len(text)
+        sections[marker] = text[index + len(marker):end].strip()
+    return sections
+
+def parse_labeled_fields(text, labels):
+    """Read "Label: value" lines, matching labels case-insensitively; missing labels map to ''"""
+    wanted = {label.lower(): label for label in labels}
+    fields = {label: "" for label in labels}
+    for line in text.splitlines():
+        name, separator, value = line.partition(':')
+        label = wanted.get(name.strip().strip('*-').strip().lower())
+        if separator and label and not fields[label]:
+            # "**Tags:** a, b" leaves the closing bold marker on the value side
+            fields[label] = value.strip().lstrip('*').strip()
+    return fields